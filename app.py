@@ -1,106 +1,65 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, stream_with_context, jsonify, make_response
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
+from werkzeug.http import is_resource_modified
 from dotenv import load_dotenv
+import hashlib
+import io
 import os
-from datetime import datetime
-from sqlalchemy import func
+from datetime import datetime, timezone
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
+from models import db, User, TestAttempt, TestAnswer
+from database import engine_options, configure_engine
+from instrumentation import instrumentation, timed
+from attempts import save_attempt
+from identity import authenticate, hash_password, user_cache, usernames, HashingBusy
+from migrations import upgrade_schema
+from rollups import user_summary, aggregate_summary
+from recommendations import answer_mask, recommendation_block, general_recommendations, CONTENT_VERSION
+from predictor import batcher, watcher
+from batch_predict import csv_text, iter_csv_records, iter_json_records, json_rows, score_records, ndjson_lines
 
 
 
 load_dotenv()  # Load environment variables
-# Add this near the top of your file
-QUESTION_RECOMMENDATIONS = {
-    'A1': {
-            1: "Consider sensory training exercises to help manage auditory sensitivity. This might include gradual exposure to different environments with varying noise levels.",
-            0: "Your normal auditory processing is a strength. Continue to maintain balanced sensory environments."
-        },
-        'A2': {
-            1: "Practice focusing on details through activities like puzzles or detailed artwork to balance your tendency to see the whole picture.",
-            0: "Work on seeing the bigger picture through activities that require holistic thinking like strategic games or system mapping."
-        },
-        'A3': {
-            1: "Your ability to multitask is a strength. Continue to utilize this in your daily activities.",
-            0: "Practice single-tasking with full attention, then gradually introduce secondary tasks to improve multitasking abilities."
-        },
-        'A4': {
-            1: "Your ability to resume tasks after interruption is a strength. Continue to apply this skill in structured environments.",
-            0: "Practice task-switching exercises and use techniques like pomodoro method to build task resumption skills."
-        },
-        'A5': {
-            1: "Continue to leverage your ability to understand implied meanings in communication.",
-            0: "Consider practicing contextual interpretation through reading literary texts with metaphors and discussing them with others."
-        },
-        'A6': {
-            1: "Your social attentiveness is a strength. Continue to observe and respond to social cues.",
-            0: "Practice recognizing boredom signals through social skills training or by watching and analyzing social interactions in media."
-        },
-        'A7': {
-            1: "Work with a therapist on theory of mind exercises to better understand others' intentions.",
-            0: "Your ability to understand others' intentions is a strength. Continue to use this in social situations."
-        },
-        'A8': {
-            1: "Consider structured social activities based on your interests to practice friendship-building skills.",
-            0: "Your social connection skills are a strength. Continue to use these skills to build and maintain relationships."
-        },
-        'A9': {
-            1: "Your enjoyment of social occasions is a strength. Continue to engage in social activities that you find pleasant.",
-            0: "Start with small, structured social interactions in environments where you feel comfortable, gradually expanding your comfort zone."
-        },
-        'A10': {
-            1: "Consider emotion recognition training or working with a therapist on empathy-building exercises.",
-            0: "Your emotional intelligence is a strength. Continue to apply this in your interpersonal relationships."
-        }
+
+QUESTIONS = {
+    1: 'Does the person speak very little and give unrelated answers to questions?',
+    2: 'Does the person not respond to their name or avoid eye contact?',
+    3: 'Does the person not engage in games of pretend with other children?',
+    4: 'Does the person struggle to understand other people’s feelings?',
+    5: 'Is the person easily upset by small changes?',
+    6: 'Does the person have obsessive interests?',
+    7: 'Is the person over or under-sensitive to smells, tastes,or touch?',
+    8: 'Does the person struggle to socialize with other children?',
+    9: 'Does the person avoid physical contact?',
+    10: 'Does the person show little awareness of dangerous situations?'
 }
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-db = SQLAlchemy(app)
-# Add this right after your db = SQLAlchemy(app) line
+db.init_app(app)
+instrumentation.init_app(app)  # per-route timings, served at /metrics
 with app.app_context():
-    db.create_all()
+    configure_engine(db.engine)
+    instrumentation.instrument_engine(db.engine)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
 
+@app.before_request
+def start_model_watcher():
+    # Per-worker thread that picks up newly published model versions
+    watcher.ensure_running()
 
-# User model for database
-class User(UserMixin, db.Model):
-    __tablename__ = 'user'  # Explicit table name
-    id = db.Column(db.Integer, primary_key=True)
-    full_name = db.Column(db.String(100), nullable=False)
-    age = db.Column(db.Integer, nullable=False)
-    username = db.Column(db.String(30), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-    date_created = db.Column(db.DateTime, default=datetime.utcnow)
-class TestAttempt(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    score = db.Column(db.Integer)
-    result = db.Column(db.String(20))  # 'Positive' or 'Negative'
-    
-    # Relationship
-    user = db.relationship('User', backref='test_attempts')
-
-class TestAnswer(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    attempt_id = db.Column(db.Integer, db.ForeignKey('test_attempt.id'))
-    question_id = db.Column(db.Integer)
-    answer = db.Column(db.Integer)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # Relationships
-    user = db.relationship('User', backref='test_answers')
-    attempt = db.relationship('TestAttempt', backref='answers')
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Served from a short TTL cache rather than a SELECT per request
+    return user_cache.get(int(user_id))
 
 # Routes
 @app.route('/')
@@ -113,8 +72,12 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        try:
+            user = authenticate(username, password)
+        except HashingBusy:
+            flash('Too many people are signing in right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        if user:
             login_user(user)
             return redirect(url_for('dashboard'))
         else:
@@ -132,25 +95,66 @@ def register():
         if User.query.filter_by(username=username).first():
             flash('Username already taken!', 'error')
         else:
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+            try:
+                hashed_password = hash_password(password)
+            except HashingBusy:
+                flash('Too many people are signing in right now. Please try again in a moment.', 'error')
+                return render_template('register.html'), 503
             new_user = User(full_name=full_name, age=age, username=username, password=hashed_password)
             db.session.add(new_user)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another registration took the name since the check above
+                db.session.rollback()
+                usernames.add(username)
+                flash('Username already taken!', 'error')
+                return render_template('register.html')
+            usernames.add(username)
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('login'))
     return render_template('register.html')
 
 
+@app.route('/api/username-available')
+def username_available():
+    # Polled as the user types on the registration form, so it is answered
+    # from the in-memory index rather than the database
+    username = request.args.get('username', '')
+    if not 3 <= len(username) <= 30:
+        return jsonify({'username': username, 'available': False,
+                        'reason': 'Usernames must be 3 to 30 characters'})
+    return jsonify({'username': username, 'available': not usernames.is_taken(username)})
+
+
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html', user=current_user)
+    # Everything on the dashboard comes from the rollup tables
+    summary = user_summary(current_user.id)
+    return render_template('dashboard.html',
+                         user=current_user,
+                         test_count=summary['test_count'],
+                         positive_count=summary['positive_count'],
+                         last_score='-' if summary['last_score'] is None else f"{summary['last_score']}%",
+                         trend=summary['trend'])
+
+@app.route('/api/dashboard/stats')
+@login_required
+def dashboard_stats():
+    return jsonify({
+        'user': user_summary(current_user.id),
+        'aggregate': aggregate_summary()
+    })
 
 @app.route('/logout')
 @login_required
 def logout():
     logout_user()
+    # Answers and demographics of an unfinished screening belong to this user
+    session.pop('answers', None)
+    session.pop('demographics', None)
     return redirect(url_for('login'))
 
 @app.route('/test-intro')
@@ -168,10 +172,15 @@ def demographics():
         autism_family = request.form.get('autism_family') == 'yes'
         relation = request.form.get('relation')
         
-        # You can store these in session or database if needed
-        # For now, we'll just proceed to questions
+        # Kept in the session so results() can feed them to the model
+        session['demographics'] = {
+            'gender': gender,
+            'jaundice': jaundice,
+            'autism_family': autism_family,
+            'relation': relation
+        }
         
-        return redirect(url_for('question', q_num=1))
+        return redirect(url_for('questionnaire'))
     
     return render_template('demographics.html')
 
@@ -179,19 +188,6 @@ def demographics():
 @login_required
 def question(q_num):
 
-    questions = {
-        1: 'Does the person speak very little and give unrelated answers to questions?',
-        2: 'Does the person not respond to their name or avoid eye contact?',
-        3: 'Does the person not engage in games of pretend with other children?',
-        4: 'Does the person struggle to understand other people’s feelings?',
-        5: 'Is the person easily upset by small changes?',
-        6: 'Does the person have obsessive interests?',
-        7: 'Is the person over or under-sensitive to smells, tastes,or touch?',
-        8: 'Does the person struggle to socialize with other children?',
-        9: 'Does the person avoid physical contact?',
-        10: 'Does the person show little awareness of dangerous situations?'
-    }
-
     # Ensure valid question number
     if q_num < 1 or q_num > 10:
         flash('Invalid question number', 'error')
@@ -199,107 +195,238 @@ def question(q_num):
     
     # Handle form submission
     if request.method == 'POST':
-        try:
-            answer = int(request.form.get('answer', 0))
-            new_answer = TestAnswer(
-                user_id=current_user.id,
-                question_id=q_num,
-                answer=answer
-            )
-            db.session.add(new_answer)
-            db.session.commit()
-            
-            if q_num == 10:
-                return redirect(url_for('results'))
+        # Answers are collected in the session and written together after question 10
+        answers = session.get('answers', {})
+        answers[str(q_num)] = 1 if request.form.get('answer') == '1' else 0
+        session['answers'] = answers
+        
+        if q_num < 10:
             return redirect(url_for('question', q_num=q_num+1))
-        except Exception as e:
-            db.session.rollback()
-            flash('Error saving your answer', 'error')
+        
+        answer_vector = [answers.get(str(i), 0) for i in range(1, 11)]
+        demographics = session.get('demographics')
+        score, result, model_version = score_answers(answer_vector, current_user.age, demographics)
+        try:
+            attempt_id = save_attempt(current_user.id, answer_vector, score, result, age=current_user.age,
+                                      model_version=model_version, demographics=demographics)
+        except Exception:
+            flash('Error saving your answers', 'error')
             return redirect(url_for('question', q_num=q_num))
+        session.pop('answers', None)
+        return redirect(url_for('results', attempt_id=attempt_id))
     
     # Render question page
     return render_template('question.html',
-                        question_text=questions[q_num],
+                        question_text=QUESTIONS[q_num],
                          question_num=q_num,
                          progress=q_num*10)
 
+def score_answers(answer_vector, age, demographics):
+    # Percentage score plus the model's verdict for one set of ten answers, and
+    # the version of the model that gave it
+    score = sum(answer_vector) * 10
+    with timed('inference'):
+        probability, model_version = batcher.predict_with_version(answer_vector, age, demographics)
+    result = "Positive" if probability >= 0.5 else "Negative"
+    return score, result, model_version
+
+def build_recommendations(answers, score):
+    # Both lists come precomputed from the shared recommendations table
+    answer_vector = [0] * 10
+    for answer in answers:
+        answer_vector[answer.question_id - 1] = answer.answer
+    return recommendation_block(answer_mask(answer_vector)), general_recommendations(score)
+
+@app.route('/questionnaire')
+@login_required
+def questionnaire():
+    # All ten questions on one page; answers stay in the browser until submit_attempt()
+    return render_template('question.html',
+                         questions=[QUESTIONS[q_num] for q_num in range(1, 11)])
+
+@app.route('/api/attempts', methods=['POST'])
+@login_required
+def submit_attempt():
+    payload = request.get_json(silent=True) or {}
+    answer_vector = payload.get('answers')
+    if (not isinstance(answer_vector, list) or len(answer_vector) != 10
+            or any(answer not in (0, 1) for answer in answer_vector)):
+        return jsonify({'error': 'Expected a list of ten answers, each 0 or 1'}), 400
+
+    demographics = session.get('demographics')
+    score, result, model_version = score_answers(answer_vector, current_user.age, demographics)
+    try:
+        attempt_id = save_attempt(current_user.id, answer_vector, score, result, age=current_user.age,
+                                  model_version=model_version, demographics=demographics)
+    except Exception:
+        return jsonify({'error': 'Error saving your answers'}), 500
+
+    return jsonify({
+        'attempt_id': attempt_id,
+        'score': score,
+        'result': result,
+        'redirect': url_for('results', attempt_id=attempt_id)
+    }), 201
+
 @app.route('/results')
 @login_required
-def results():
-    # Get all answers for this user's latest test
-    answers = TestAnswer.query.filter_by(
+def latest_results():
+    # Results are addressed by attempt; this just points at the most recent one
+    attempt = TestAttempt.query.filter_by(
         user_id=current_user.id
-    ).order_by(TestAnswer.timestamp.desc()).limit(10).all()
-    
-    # Calculate score
-    score = sum(answer.answer for answer in answers) * 10
-    result = "Positive" if score >= 70 else "Negative"
-    
-    # Generate question-specific recommendations
-    question_recommendations = []
-    for answer in answers:
-        question_id = f"A{answer.question_id}"
-        if question_id in QUESTION_RECOMMENDATIONS:
-            rec = QUESTION_RECOMMENDATIONS[question_id][answer.answer]
-            question_recommendations.append({
-                'question': f"Question {answer.question_id}",
-                'answer': "Agree" if answer.answer == 1 else "Disagree",
-                'recommendation': rec
-            })
-    
-    # Generate overall recommendations
-    if score >= 80:
-        general_recommendations = [
-            "Consider professional evaluation.",
-            "Your answers suggest very high probability of Autism."
-        ]
-    elif (score <80 and score >=50):
-        general_recommendations = [
-            "Your results suggest typical characteristics.",
-            "Continue monitoring if concerned."
-        ]
-    else :
-        general_recommendations = [
-            "Your results suggest that probability of Autism is low, still can take medical advice.",
-        ]
-    
-    # Save test attempt
-    # Create test attempt record
-    new_attempt = TestAttempt(
-        user_id=current_user.id,
-        score=score,
-        result=result
-    )
-    db.session.add(new_attempt)
-    db.session.commit()
+    ).order_by(TestAttempt.timestamp.desc()).first()
+    if attempt is None:
+        return redirect(url_for('test_intro'))
+    return redirect(url_for('results', attempt_id=attempt.id))
+
+_results_version = None
+
+def results_version():
+    # Part of the results ETag: a digest of the recommendation texts and the
+    # results template, so cached pages are revalidated after either changes
+    global _results_version
+    if _results_version is None:
+        source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, 'results.html')
+        template_digest = hashlib.sha256(source.encode()).hexdigest()[:12]
+        _results_version = f'{CONTENT_VERSION}-{template_digest}'
+    return _results_version
+
+@app.route('/results/<int:attempt_id>')
+@login_required
+def results(attempt_id):
+    # Read-only view of an attempt scored at submission time
+    attempt = TestAttempt.query.filter_by(
+        id=attempt_id, user_id=current_user.id
+    ).first_or_404()
     
-    # Associate answers with this attempt
-    for answer in answers:
-        answer.attempt_id = new_attempt.id
-    db.session.commit()
+    # Stored attempts never change, so refreshes and back-button views can be
+    # answered with a 304 before the answers are loaded or anything is rendered
+    etag = f'attempt-{attempt.id}-{results_version()}'
+    last_modified = attempt.timestamp.replace(microsecond=0, tzinfo=timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        answers = attempt.answers  # loaded here so its query is not timed as recommendations
+        with timed('recommendations'):
+            question_recs, general_recs = build_recommendations(answers, attempt.score)
+        response = make_response(render_template('results.html',
+                             score=attempt.score,
+                             result=attempt.result,
+                             question_recommendations=question_recs,
+                             general_recommendations=general_recs))
     
-    return render_template('results.html',
-                         score=score,
-                         result=result,
-                         question_recommendations=question_recommendations,
-                         general_recommendations=general_recommendations)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+HISTORY_PAGE_SIZE = 20
+
+def encode_cursor(attempt):
+    return f"{attempt.timestamp.isoformat()}_{attempt.id}"
+
+def decode_cursor(cursor):
+    timestamp, attempt_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(timestamp), int(attempt_id)
 
 @app.route('/history')
 @login_required
 def history():
-    # Get all test attempts with their answers
-    attempts = TestAttempt.query.filter_by(
-        user_id=current_user.id
-    ).options(
-        db.joinedload(TestAttempt.answers)
-    ).order_by(TestAttempt.timestamp.desc()).all()
+    # Keyset pagination on (timestamp, id): each page is one index range read,
+    # however long the user's history is. Answers are fetched on demand.
+    query = TestAttempt.query.filter_by(user_id=current_user.id)
+    before = request.args.get('before')
+    if before:
+        try:
+            query = query.filter(tuple_(TestAttempt.timestamp, TestAttempt.id) < decode_cursor(before))
+        except ValueError:
+            return redirect(url_for('history'))
+    
+    attempts = query.order_by(
+        TestAttempt.timestamp.desc(), TestAttempt.id.desc()
+    ).limit(HISTORY_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(attempts) > HISTORY_PAGE_SIZE:
+        attempts = attempts[:HISTORY_PAGE_SIZE]
+        next_cursor = encode_cursor(attempts[-1])
+    
+    test_count = db.session.query(func.count(TestAttempt.id)).filter(
+        TestAttempt.user_id == current_user.id
+    ).scalar()
     
     return render_template('history.html',
                          attempts=attempts,
-                         test_count=len(attempts))
+                         test_count=test_count,
+                         next_cursor=next_cursor,
+                         first_page=not before)
 
+@app.route('/api/attempts/<int:attempt_id>/answers')
+@login_required
+def attempt_answers(attempt_id):
+    answers = TestAnswer.query.filter_by(
+        attempt_id=attempt_id, user_id=current_user.id
+    ).order_by(TestAnswer.question_id).all()
+    if not answers:
+        return jsonify({'error': 'Attempt not found'}), 404
+    return jsonify([
+        {'question_id': answer.question_id, 'answer': answer.answer}
+        for answer in answers
+    ])
 
-if __name__ == '__main__':
+@app.route('/api/predict/stats')
+@login_required
+def predict_stats():
+    # Inference latency, micro-batching and prediction cache hit rates for this worker
+    predictor = batcher.predictor
+    return jsonify({
+        'model_version': predictor.version,
+        'latency': predictor.latency_percentiles(),
+        'batching': batcher.stats(),
+        'cache': predictor.cache.stats() if predictor.cache is not None else None,
+        'registry': watcher.stats()
+    })
+
+@app.route('/api/predict/batch', methods=['POST'])
+@login_required
+def predict_batch():
+    # Accepts a CSV upload (form field "file"), a raw CSV body or a JSON list of
+    # records in the Autism-Adult-Data.csv layout; results stream back as NDJSON
+    if request.is_json:
+        try:
+            rows = json_rows(request.get_json())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        records = iter_json_records(rows)
+    else:
+        # Read up front: the upload is closed once the view returns and streaming starts
+        data = request.files['file'].read() if 'file' in request.files else request.get_data()
+        try:
+            upload = csv_text(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        records = iter_csv_records(io.StringIO(upload, newline=''))
+
+    return Response(stream_with_context(ndjson_lines(score_records(records))),
+                    mimetype='application/x-ndjson')
+
+
+def create_app():
+    # Entry point for WSGI servers (see gunicorn.conf.py):
+    #   gunicorn -c gunicorn.conf.py
+    #   uvicorn --interface wsgi --factory app:create_app
+    # Importing this module touches no database; the schema is brought up to
+    # date here, by the gunicorn master with preload_app, otherwise by each
+    # worker in turn (see migrations.schema_lock).
     with app.app_context():
-        db.create_all()  # Create database tables
-    app.run(debug=True)
\ No newline at end of file
+        upgrade_schema()  # create_all() plus indexes/columns missing from older databases
+        usernames.warm()
+        # With preload_app the master runs this before forking; connections
+        # opened for the upgrade must not be inherited by the workers
+        db.engine.dispose()
+    return app
+
+
+if __name__ == '__main__':
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,45 @@
+# Attempt persistence: an attempt and its ten answers are written with two
+# INSERT statements (the answers as one executemany) inside one transaction,
+# together with the rollup updates, so a screening costs a single commit and a
+# single hold of SQLite's write lock.
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, TestAttempt, TestAnswer
+from rollups import record_attempt
+
+
+def save_attempt(user_id, answer_vector, score, result, age=None, model_version=None, demographics=None):
+    # answer_vector[i] is the 0/1 answer to question i + 1; age feeds the
+    # age-group rollup; demographics is the dict app.demographics() keeps in
+    # the session. Returns the new attempt id
+    now = datetime.utcnow()
+    demographics = demographics or {}
+    try:
+        attempt_id = db.session.execute(
+            insert(TestAttempt)
+            .values(user_id=user_id, timestamp=now, score=score, result=result,
+                    model_version=model_version,
+                    gender=demographics.get('gender'),
+                    jaundice=demographics.get('jaundice'),
+                    autism_family=demographics.get('autism_family'),
+                    relation=demographics.get('relation'))
+            .returning(TestAttempt.id)
+        ).scalar_one()
+        db.session.execute(insert(TestAnswer), [
+            {
+                'user_id': user_id,
+                'attempt_id': attempt_id,
+                'question_id': q_num,
+                'answer': int(answer),
+                'timestamp': now
+            }
+            for q_num, answer in enumerate(answer_vector, start=1)
+        ])
+        record_attempt(user_id, age, answer_vector, score, result, now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return attempt_id
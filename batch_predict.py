@@ -0,0 +1,112 @@
+# Bulk screening: score spreadsheets in the Autism-Adult-Data.csv layout.
+# Used by the /api/predict/batch endpoint and runnable from the command line:
+#   python batch_predict.py uploads.csv -o scored.csv
+import argparse
+import csv
+import json
+import sys
+import time
+
+from features import parse_record
+from instrumentation import timed
+from predictor import active
+from utils import chunked
+
+CHUNK_SIZE = 256
+OUTPUT_FIELDS = ['id', 'probability', 'result']
+
+
+def csv_text(data):
+    # An uploaded CSV as text; utf-8-sig drops the byte order mark Excel writes
+    # for "CSV UTF-8", which would otherwise be read into the first column name
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError('The CSV file is not UTF-8 encoded')
+
+
+def iter_csv_records(lines):
+    for row in csv.DictReader(lines):
+        yield parse_record(row)
+
+
+def json_rows(payload):
+    # The list of records in a JSON payload: either the list itself or
+    # {"records": [...]}. Checked before any output so bad requests get a 400.
+    rows = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise ValueError('Expected a JSON list of records, or {"records": [...]}')
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f'Record {i} is not a JSON object')
+    return rows
+
+
+def iter_json_records(rows):
+    # rows as returned by json_rows(); a bad field value ends the output with an error
+    for i, row in enumerate(rows):
+        if any(value is not None and not isinstance(value, (str, int, float)) for value in row.values()):
+            raise ValueError(f'Record {i} has a field that is not a string or number')
+        yield parse_record(row)
+
+
+def score_records(records, chunk_size=CHUNK_SIZE):
+    # Scores in chunks so results can be streamed while the rest is still parsed;
+    # each chunk goes through one vectorized transform and predict_proba call.
+    for chunk in chunked(records, chunk_size):
+        yield from _score_chunk(chunk)
+
+
+def _score_chunk(chunk):
+    with timed('inference'):
+        probabilities = active().predict_records(chunk)
+    for record, probability in zip(chunk, probabilities):
+        yield {
+            'id': record.get('id'),
+            'probability': round(float(probability), 6),
+            'result': 'Positive' if probability >= 0.5 else 'Negative',
+        }
+
+
+def ndjson_lines(results):
+    # Headers are already sent once streaming starts, so a malformed row ends
+    # the stream with an error line instead of an HTTP error status
+    try:
+        for result in results:
+            yield json.dumps(result) + '\n'
+    except (ValueError, csv.Error) as e:
+        yield json.dumps({'error': str(e)}) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV or JSON file of screenings.')
+    parser.add_argument('input', help='CSV in the Autism-Adult-Data.csv layout, or a .json list of records')
+    parser.add_argument('-o', '--output', help='CSV file to write (default: stdout)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    with open(args.input, newline='', encoding='utf-8-sig') as src:
+        if args.input.endswith('.json'):
+            records = iter_json_records(json_rows(json.load(src)))
+        else:
+            records = iter_csv_records(src)
+
+        out = open(args.output, 'w', newline='') if args.output else sys.stdout
+        try:
+            writer = csv.DictWriter(out, fieldnames=OUTPUT_FIELDS)
+            writer.writeheader()
+            start = time.perf_counter()
+            count = 0
+            for result in score_records(records, args.chunk_size):
+                writer.writerow(result)
+                count += 1
+        finally:
+            if args.output:
+                out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f'Scored {count} screenings in {elapsed:.3f}s ({count / elapsed:.0f}/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
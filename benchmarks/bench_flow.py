@@ -0,0 +1,326 @@
+# Load test of the full screening flow plus encoding/inference microbenchmarks.
+#   python -m benchmarks.bench_flow [--users 40] [--concurrency 8] [--json out.json]
+#   python -m benchmarks.bench_flow --url http://127.0.0.1:8000   # a running gunicorn
+#   python -m benchmarks.bench_flow --baseline before.json        # exit 1 on a regression
+#
+# Each simulated user registers, signs in, fills in the demographics form,
+# answers the questions, opens the results and then the history page. With
+# --flow pages the questions are answered one page at a time; with --flow json
+# the single-page questionnaire submits all ten to /api/attempts, as script.js
+# does; the default, mixed, alternates the two between users.
+# Users run on --concurrency threads, in process through Flask's test client
+# against a throwaway SQLite database, or over HTTP with --url. Answers are
+# drawn from a seeded generator so runs are comparable.
+#
+# Reports requests/sec and latency percentiles per route, and how long one
+# record takes to encode and score. Requests answered with an unexpected status
+# are counted as errors and left out of the percentiles, and fail the run;
+# --fail-fast stops at the first one. With --baseline, any p50 or microbenchmark
+# slower than the baseline by more than --tolerance fails the run; compare runs
+# with the same --users, --concurrency and --flow (--concurrency 1 is the steadiest).
+#
+# Registration and login hash passwords with a cheap method unless
+# PASSWORD_HASH_METHOD is set; otherwise they dominate every other route.
+import argparse
+import json
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict, namedtuple
+
+DB_DIR = tempfile.mkdtemp(prefix='bench_flow_')
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.db')
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from predictor import active, record_from_form  # noqa: E402
+
+PASSWORD = 'bench-password'
+GENDERS = ['male', 'female']
+RELATIONS = ['self', 'parent', 'relative']
+MICRO_BATCH = 1000
+FLOWS = ('mixed', 'pages', 'json')
+
+Reply = namedtuple('Reply', 'status location body')
+
+
+class UnexpectedStatus(Exception):
+    pass
+
+
+class LocalClient:
+    """One user's session against the app in this process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, json_body=None):
+        response = self.client.open(path, method=method, data=data, json=json_body)
+        body = response.get_data()
+        response.close()
+        return Reply(response.status_code, response.headers.get('Location'), body)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Redirects are part of the flow being timed, so they are followed by hand
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """One user's session, with its own cookie jar, against a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(), NoRedirect())
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {}
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        else:
+            body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return Reply(response.status, response.headers.get('Location'), response.read())
+        except urllib.error.HTTPError as e:
+            return Reply(e.code, e.headers.get('Location'), e.read())
+
+
+class Recorder:
+    """Latency samples of expected responses, and unexpected statuses, per route."""
+
+    def __init__(self, fail_fast=False):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.fail_fast = fail_fast
+        self._lock = threading.Lock()
+
+    def call(self, route, client, method, path, data=None, expect=200, json_body=None):
+        start = time.perf_counter()
+        reply = client.request(method, path, data, json_body)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            # Error pages are usually much faster or slower than the real
+            # thing, so they would skew the percentiles either way
+            if reply.status == expect:
+                self.samples[route].append(elapsed)
+            else:
+                self.errors[route] += 1
+        if reply.status != expect and self.fail_fast:
+            raise UnexpectedStatus(f'{method} {path} returned {reply.status}, expected {expect}')
+        # Absolute in HTTP responses, a path from the test client
+        location = urllib.parse.urlsplit(reply.location).path if reply.location else None
+        return reply._replace(location=location)
+
+    def report(self, elapsed):
+        routes = {}
+        for route in list(self.samples) + [route for route in self.errors if route not in self.samples]:
+            samples = self.samples[route]
+            stats = {'count': len(samples), 'rps': round(len(samples) / elapsed, 2), 'errors': self.errors[route]}
+            if samples:
+                p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000
+                stats.update(p50_ms=round(p50, 3), p90_ms=round(p90, 3), p99_ms=round(p99, 3),
+                             max_ms=round(max(samples) * 1000, 3))
+            routes[route] = stats
+        return routes
+
+
+def answer_pages(client, recorder, rng):
+    # Returns the results page the last answer redirects to
+    for q_num in range(1, 11):
+        recorder.call('GET /question/<n>', client, 'GET', f'/question/{q_num}')
+        results = recorder.call('POST /question/<n>', client, 'POST', f'/question/{q_num}',
+                                {'answer': str(rng.integers(0, 2))}, expect=302).location
+    return results
+
+
+def answer_json(client, recorder, rng):
+    recorder.call('GET /questionnaire', client, 'GET', '/questionnaire')
+    reply = recorder.call('POST /api/attempts', client, 'POST', '/api/attempts',
+                          json_body={'answers': [int(answer) for answer in rng.integers(0, 2, 10)]}, expect=201)
+    if reply.status != 201:
+        return None
+    return json.loads(reply.body)['redirect']
+
+
+def screening(client, recorder, username, rng, flow):
+    age = int(rng.integers(18, 70))
+    recorder.call('POST /register', client, 'POST', '/register', {
+        'full_name': 'Load Test', 'age': age, 'username': username, 'password': PASSWORD}, expect=302)
+    recorder.call('POST /login', client, 'POST', '/login', {'username': username, 'password': PASSWORD}, expect=302)
+    recorder.call('GET /demographics', client, 'GET', '/demographics')
+    recorder.call('POST /demographics', client, 'POST', '/demographics', {
+        'gender': GENDERS[rng.integers(len(GENDERS))],
+        'relation': RELATIONS[rng.integers(len(RELATIONS))],
+        'jaundice': 'yes' if rng.random() < 0.2 else 'no',
+        'autism_family': 'yes' if rng.random() < 0.2 else 'no',
+    }, expect=302)
+    results = answer_json(client, recorder, rng) if flow == 'json' else answer_pages(client, recorder, rng)
+    recorder.call('GET /results/<id>', client, 'GET', results or '/results')
+    recorder.call('GET /history', client, 'GET', '/history')
+
+
+def run_flow(make_client, users, concurrency, prefix, seed, flow='mixed', fail_fast=False):
+    recorder = Recorder(fail_fast)
+    failure = []
+    next_user = iter(range(users))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(next_user, None)
+            if i is None or failure:
+                return
+            user_flow = flow if flow != 'mixed' else FLOWS[1 + i % 2]
+            try:
+                screening(make_client(), recorder, f'{prefix}{i}', np.random.default_rng([seed, i]), user_flow)
+            except UnexpectedStatus as e:
+                failure.append(e)
+                return
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failure:
+        raise failure[0]
+    return recorder, time.perf_counter() - start
+
+
+def time_us(fn, n):
+    start = time.perf_counter()
+    fn()
+    return round((time.perf_counter() - start) / n * 1e6, 3)
+
+
+def microbenchmarks(iterations, seed):
+    # Microseconds per record for each serving step, on the active model
+    predictor = active()
+    rng = np.random.default_rng(seed)
+    records = [record_from_form(rng.integers(0, 2, 10), int(rng.integers(4, 70)),
+                                {'gender': GENDERS[i % 2], 'relation': RELATIONS[i % 3]})
+               for i in range(max(iterations, MICRO_BATCH))]
+    X = predictor.pipeline.transform_many(records)
+    rows = X[:iterations]
+
+    results = {
+        'encode one record': time_us(
+            lambda: [predictor.pipeline.transform(record) for record in records[:iterations]], iterations),
+        f'encode batch of {MICRO_BATCH}': time_us(
+            lambda: predictor.pipeline.transform_many(records[:MICRO_BATCH]), MICRO_BATCH),
+        'predict_proba one row': time_us(
+            lambda: [predictor.predict_proba(rows[i:i + 1]) for i in range(len(rows))], iterations),
+        f'predict_proba batch of {MICRO_BATCH}': time_us(
+            lambda: predictor.predict_proba(X[:MICRO_BATCH]), MICRO_BATCH),
+    }
+    if predictor.cache is not None:
+        predictor.score(rows)
+        results['cached score one row'] = time_us(
+            lambda: [predictor.score(rows[i:i + 1]) for i in range(len(rows))], iterations)
+    return results
+
+
+def compare(current, baseline, tolerance):
+    # Lines describing every figure that got slower by more than tolerance
+    pairs = [(f'{route} p50', stats['p50_ms'], baseline['routes'].get(route, {}).get('p50_ms'))
+             for route, stats in current['routes'].items() if 'p50_ms' in stats]
+    pairs += [(name, value, baseline['micro_us'].get(name)) for name, value in current['micro_us'].items()]
+    return [f'{name}: {before} -> {after} ({after / before:.2f}x)'
+            for name, after, before in pairs if before and after > before * (1 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the screening flow.')
+    parser.add_argument('--users', type=int, default=40, help='screenings to run')
+    parser.add_argument('--concurrency', type=int, default=8, help='users in flight at once')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed screenings run first')
+    parser.add_argument('--url', help='base URL of a running server instead of the in-process app')
+    parser.add_argument('--flow', choices=FLOWS, default='mixed',
+                        help='answer the questions page by page, through the JSON API, or alternate')
+    parser.add_argument('--fail-fast', action='store_true', help='stop at the first unexpected status')
+    parser.add_argument('--iterations', type=int, default=2000, help='records per microbenchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    args = parser.parse_args()
+
+    if args.url:
+        def make_client():
+            return HttpClient(args.url)
+        target = args.url
+    else:
+        from app import create_app
+        app = create_app()
+
+        def make_client():
+            return LocalClient(app)
+        target = f'in-process app, database in {DB_DIR}'
+
+    # Usernames stay unique when a live server's database is reused
+    prefix = f'load{secrets.token_hex(3)}_'
+    try:
+        run_flow(make_client, args.warmup, 1, prefix + 'w', args.seed, args.flow, args.fail_fast)
+        recorder, elapsed = run_flow(make_client, args.users, args.concurrency, prefix, args.seed,
+                                     args.flow, args.fail_fast)
+    except UnexpectedStatus as e:
+        sys.exit(f'aborted: {e}')
+    routes = recorder.report(elapsed)
+    requests = sum(stats['count'] for stats in routes.values())
+
+    print(f'{args.users} screenings ({args.flow} flow), {args.concurrency} concurrent, against {target}')
+    print(f'{requests} requests in {elapsed:.2f}s: {requests / elapsed:.1f} req/s, '
+          f'{args.users / elapsed:.2f} screenings/s\n')
+    print(f"{'route':<22}{'count':>7}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}")
+    for route, stats in routes.items():
+        timings = ''.join(f"{stats[key]:>9.2f}" if key in stats else f"{'-':>9}"
+                          for key in ('p50_ms', 'p90_ms', 'p99_ms', 'max_ms'))
+        print(f"{route:<22}{stats['count']:>7}{stats['rps']:>9.1f}{timings}{stats['errors']:>8}")
+
+    micro = microbenchmarks(args.iterations, args.seed)
+    print(f'\nmicrobenchmarks (model {active().version}, us per record)')
+    for name, us in micro.items():
+        print(f'  {name:<30}{us:>10.2f}')
+
+    results = {'users': args.users, 'concurrency': args.concurrency, 'flow': args.flow, 'target': target,
+               'elapsed_s': round(elapsed, 3), 'rps': round(requests / elapsed, 2),
+               'routes': routes, 'micro_us': micro}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    failed = sum(recorder.errors.values())
+    if failed:
+        print(f'\n{failed} requests returned an unexpected status')
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if (baseline['users'], baseline['concurrency'], baseline.get('flow', 'pages')) != \
+                (args.users, args.concurrency, args.flow):
+            print(f"\nwarning: baseline ran {baseline['users']} users at concurrency {baseline['concurrency']}, "
+                  f"{baseline.get('flow', 'pages')} flow")
+        regressions = compare(results, baseline, args.tolerance)
+        print(f'\n{len(regressions)} regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+        for line in regressions:
+            print('  ' + line)
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
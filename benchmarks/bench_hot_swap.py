@@ -0,0 +1,88 @@
+# Model hot-swap under load, against a throwaway model registry.
+#   python -m benchmarks.bench_hot_swap [--threads 16] [--seconds 10] [--swaps 20]
+#
+# Publishes two model versions (the linear SVC and an RBF SVC), then keeps the
+# prediction path busy from many threads while the active version is flipped
+# back and forth. Every prediction must succeed and report the version that
+# produced it.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+os.environ['MODEL_REGISTRY_DIR'] = tempfile.mkdtemp(prefix='bench_hot_swap_')
+os.environ.setdefault('MODEL_POLL_SECONDS', '0.05')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import model_training  # noqa: E402
+from predictor import batcher, watcher, registry  # noqa: E402
+
+
+def publish_versions():
+    dataset = model_training.prepare()
+    _, X_test, _, y_test = model_training.split(dataset.X, dataset.y)
+    versions = []
+    for params in ({'kernel': 'linear', 'C': 13}, {'kernel': 'rbf', 'C': 10}):
+        model = model_training.fit(dataset, params)
+        metrics = model_training.model_report(y_test, model.predict(X_test))
+        versions.append(registry.publish(model, dataset.pipeline, metrics, params, X_test, activate=False))
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot-swap model versions under load.')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--swaps', type=int, default=20)
+    args = parser.parse_args()
+
+    versions = publish_versions()
+    print(f'Registry {registry.root}: versions {versions}')
+
+    stop = threading.Event()
+    served = Counter()
+    failures = []
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = np.random.default_rng(seed)
+        while not stop.is_set():
+            try:
+                _, version = batcher.predict_with_version(
+                    rng.integers(0, 2, 10), int(rng.integers(4, 70)), {'gender': 'male'})
+                with lock:
+                    served[version] += 1
+            except Exception as e:
+                with lock:
+                    failures.append(repr(e))
+
+    watcher.ensure_running()
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for i in range(args.swaps):
+        registry.activate(versions[i % 2])
+        time.sleep(args.seconds / args.swaps)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(served.values())
+    print(f'{total} predictions in {elapsed:.1f}s ({total / elapsed:.0f}/s) from {args.threads} threads')
+    print(f'{watcher.swaps} swaps applied, {len(failures)} failed predictions')
+    for version, count in served.most_common():
+        print(f'  {version}: {count}')
+    if failures:
+        print('First failure:', failures[0])
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Linear scorer versus the pickled SVC: per-prediction latency and memory.
+#   python -m benchmarks.bench_linear [--iterations 2000]
+#
+# Scores the same encoded screenings with both models one row at a time (the
+# web flow) and in batches of 256 (batch_predict), checks they agree, and
+# reports artifact size plus the memory allocated while loading each model.
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib  # noqa: E402
+import numpy as np  # noqa: E402
+import sklearn.svm  # noqa: E402,F401
+
+from linear_scorer import LinearScorer, is_linear, file_digest  # noqa: E402
+from predictor import MODEL_PATH, LINEAR_MODEL_PATH, PIPELINE_PATH, record_from_form  # noqa: E402
+from features import FeaturePipeline  # noqa: E402
+
+BATCH_SIZE = 256
+
+
+def measure_load(load):
+    # Modules are imported beforehand so only the model itself is counted
+    tracemalloc.start()
+    model = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return model, peak
+
+
+def per_row_us(model, X):
+    start = time.perf_counter()
+    for i in range(len(X)):
+        model.predict_proba(X[i:i + 1])
+    return (time.perf_counter() - start) / len(X) * 1e6
+
+
+def batched_us(model, X):
+    start = time.perf_counter()
+    for i in range(0, len(X), BATCH_SIZE):
+        model.predict_proba(X[i:i + BATCH_SIZE])
+    return (time.perf_counter() - start) / len(X) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Linear scorer vs pickled SVC benchmark.')
+    parser.add_argument('--iterations', type=int, default=2000, help='screenings scored per model')
+    args = parser.parse_args()
+
+    svc, svc_peak = measure_load(lambda: joblib.load(MODEL_PATH))
+    if not is_linear(svc):
+        sys.exit(f'{MODEL_PATH} is not a linear model; there is no scorer to compare')
+    if os.path.exists(LINEAR_MODEL_PATH) and LinearScorer.load(LINEAR_MODEL_PATH).source == file_digest(MODEL_PATH):
+        scorer, scorer_peak = measure_load(lambda: LinearScorer.load(LINEAR_MODEL_PATH))
+        scorer_bytes = os.path.getsize(LINEAR_MODEL_PATH)
+    else:
+        print(f'{LINEAR_MODEL_PATH} missing or stale; comparing against a scorer built in memory')
+        scorer, scorer_peak = measure_load(lambda: LinearScorer.from_estimator(svc))
+        scorer_bytes = None
+
+    pipeline = FeaturePipeline.load(PIPELINE_PATH)
+    rng = np.random.default_rng(0)
+    X = pipeline.transform_many(
+        record_from_form(rng.integers(0, 2, 10), int(rng.integers(4, 70)),
+                         {'gender': 'female', 'relation': 'self'})
+        for _ in range(args.iterations))
+
+    error = scorer.check_parity(svc, X)
+    print(f'{args.iterations} screenings, {X.shape[1]} features, '
+          f'{len(svc.support_)} support vectors, max |dp| = {error:.2g}\n')
+    print(f"{'':>14} {'per row':>10} {'batched':>10} {'artifact':>10} {'load alloc':>11}")
+    for name, model, artifact, peak in (('pickled SVC', svc, os.path.getsize(MODEL_PATH), svc_peak),
+                                        ('linear scorer', scorer, scorer_bytes, scorer_peak)):
+        artifact = f'{artifact} B' if artifact is not None else '-'
+        print(f'{name:>14} {per_row_us(model, X):8.1f}us {batched_us(model, X):8.2f}us '
+              f'{artifact:>10} {peak / 1024:8.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# Login burst load test against a throwaway SQLite database.
+#   python -m benchmarks.bench_login [--threads 8] [--logins 3] [--legacy-method pbkdf2:sha256:260000]
+#
+# Seeds users, then has every thread sign in repeatedly (a classroom logging
+# in at once) while one already signed-in client keeps requesting a page.
+# Reports logins/sec, login latency, the latency of that other traffic during
+# the burst, and how many SQL statements an authenticated request costs. With
+# --legacy-method the users start with an older hash and are upgraded to
+# PASSWORD_HASH_METHOD on their first login.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+DB_DIR = tempfile.mkdtemp(prefix='bench_login_')
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app  # noqa: E402
+from identity import hashing, user_cache, needs_rehash  # noqa: E402
+from models import db, User  # noqa: E402
+
+PASSWORD = 'bench-password'
+
+app = create_app()
+
+
+def seed(users, method):
+    # Every user shares one precomputed hash so seeding does not dominate the run
+    password = generate_password_hash(PASSWORD, method)
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'full_name': f'Bench {i}', 'age': 30, 'username': f'bench{i}', 'password': password}
+            for i in range(users)
+        ])
+        db.session.commit()
+
+
+def percentiles(samples):
+    if not samples:
+        return 'n/a'
+    p50, p99 = np.percentile(samples, [50, 99]) * 1000
+    return f'p50 {p50:7.1f}ms  p99 {p99:7.1f}ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Login burst load test.')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=8, help='users signing in at once')
+    parser.add_argument('--logins', type=int, default=3, help='logins per thread')
+    parser.add_argument('--legacy-method', help='hash method the seeded users start with')
+    args = parser.parse_args()
+
+    seed(args.users, args.legacy_method or hashing.method)
+    print(f'{args.users} users, {args.threads} threads x {args.logins} logins, '
+          f'{hashing.slots} hashing slots, method {hashing.method}, database in {DB_DIR}')
+
+    # One signed-in user whose page loads should not stall behind the burst
+    background = app.test_client()
+    background.post('/login', data={'username': 'bench0', 'password': PASSWORD})
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *rest: statements.append(statement))
+    background.get('/api/dashboard/stats')
+    cold = len(statements)
+    statements.clear()
+    background.get('/api/dashboard/stats')
+    warm = len(statements)
+
+    login_times, page_times, statuses = [], [], []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def sign_in(thread_id):
+        client = app.test_client()
+        for i in range(args.logins):
+            username = f'bench{(thread_id * args.logins + i) % args.users}'
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': username, 'password': PASSWORD})
+            elapsed = time.perf_counter() - start
+            client.get('/logout')
+            with lock:
+                login_times.append(elapsed)
+                statuses.append(response.status_code)
+
+    def browse():
+        while not stop.is_set():
+            start = time.perf_counter()
+            background.get('/api/dashboard/stats')
+            page_times.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    browser = threading.Thread(target=browse)
+    browser.start()
+    threads = [threading.Thread(target=sign_in, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    browser.join()
+
+    logins = sum(1 for status in statuses if status == 302)
+    print(f'\nlogins:     {logins / elapsed:7.2f}/s  {percentiles(login_times)}  '
+          f'({logins} ok, {statuses.count(503)} refused as busy)')
+    print(f'other page: {len(page_times) / elapsed:7.2f}/s  {percentiles(page_times)}  during the burst')
+    print(f'SQL statements per authenticated request: {cold} cold, {warm} with the user cached')
+    print(f'user cache: {user_cache.stats()}')
+    if args.legacy_method:
+        with app.app_context():
+            upgraded = sum(not needs_rehash(user.password, hashing.method) for user in User.query.all())
+        print(f'hashes upgraded from {args.legacy_method}: {upgraded}/{args.users}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Attempt write throughput against a throwaway SQLite database.
+#   python -m benchmarks.bench_writes [--users 50] [--attempts 20]
+#
+# "before" replays the original flow: one commit per answer, a commit for the
+# attempt, then a commit re-pointing every answer at it (12 commits per attempt).
+# "after" uses attempts.save_attempt (one transaction, bulk answer insert).
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+DB_DIR = tempfile.mkdtemp(prefix='bench_writes_')
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from attempts import save_attempt  # noqa: E402
+from models import db, User, TestAttempt, TestAnswer  # noqa: E402
+
+ANSWERS = [1, 0, 1, 1, 0, 0, 1, 0, 1, 1]
+
+
+def write_before(user_id):
+    answers = []
+    for q_num, answer in enumerate(ANSWERS, start=1):
+        new_answer = TestAnswer(user_id=user_id, question_id=q_num, answer=answer)
+        db.session.add(new_answer)
+        db.session.commit()
+        answers.append(new_answer)
+    new_attempt = TestAttempt(user_id=user_id, score=60, result='Negative')
+    db.session.add(new_attempt)
+    db.session.commit()
+    for answer in answers:
+        answer.attempt_id = new_attempt.id
+    db.session.commit()
+
+
+def write_after(user_id):
+    save_attempt(user_id, ANSWERS, 60, 'Negative', age=30)
+
+
+def run(write, user_ids, attempts):
+    errors = []
+
+    def worker(user_id):
+        with app.app_context():
+            for _ in range(attempts):
+                try:
+                    write(user_id)
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    completed = len(user_ids) * attempts - len(errors)
+    return completed / elapsed, elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Attempt write throughput benchmark.')
+    parser.add_argument('--users', type=int, default=50, help='concurrent users (threads)')
+    parser.add_argument('--attempts', type=int, default=20, help='attempts written per user')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        users = [User(full_name=f'Bench {i}', age=30, username=f'bench{i}', password='x')
+                 for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+
+    print(f'{args.users} concurrent users x {args.attempts} attempts, database in {DB_DIR}')
+    for name, write in (('before', write_before), ('after', write_after)):
+        rate, elapsed, errors = run(write, user_ids, args.attempts)
+        print(f'{name:>6}: {rate:8.1f} attempts/s ({rate * 11:8.1f} rows/s) '
+              f'in {elapsed:.2f}s, {errors} failed')
+
+
+if __name__ == '__main__':
+    main()
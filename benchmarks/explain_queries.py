@@ -0,0 +1,125 @@
+# Query plans and per-route statement counts for the results/history hot paths.
+#   python -m benchmarks.explain_queries [--attempts 5000]
+#
+# Seeds one user with a long history in a throwaway SQLite database, prints
+# EXPLAIN QUERY PLAN for the statements those routes issue, then requests each
+# route and reports how many SQL statements it executed. A plan line containing
+# "SCAN" or "TEMP B-TREE" means that query is not served from an index.
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_DIR = tempfile.mkdtemp(prefix='explain_queries_')
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(DB_DIR, 'explain.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, insert, text, tuple_  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import app, HISTORY_PAGE_SIZE  # noqa: E402
+from models import db, User, TestAttempt, TestAnswer  # noqa: E402
+
+USERNAME = 'explain'
+PASSWORD = 'explain-password'
+
+
+def seed(attempts, other_users=10):
+    db.create_all()
+    users = [User(full_name='Explain', age=30, username=USERNAME,
+                  password=generate_password_hash(PASSWORD))]
+    users += [User(full_name=f'Other {i}', age=30, username=f'other{i}', password='x')
+              for i in range(other_users)]
+    db.session.add_all(users)
+    db.session.commit()
+
+    # Other users get shorter, interleaved histories so the tables are realistically mixed
+    start = datetime(2020, 1, 1)
+    attempt_rows = [
+        {'user_id': user.id, 'timestamp': start + timedelta(hours=i), 'score': 50, 'result': 'Negative'}
+        for i in range(attempts)
+        for user in (users if i % 10 == 0 else users[:1])
+    ]
+    db.session.execute(insert(TestAttempt), attempt_rows)
+    answer_rows = [
+        {'user_id': user_id, 'attempt_id': attempt_id, 'question_id': q_num,
+         'answer': q_num % 2, 'timestamp': timestamp}
+        for attempt_id, user_id, timestamp in db.session.execute(
+            db.select(TestAttempt.id, TestAttempt.user_id, TestAttempt.timestamp))
+        for q_num in range(1, 11)
+    ]
+    db.session.execute(insert(TestAnswer), answer_rows)
+    db.session.commit()
+    return users[0]
+
+
+def hot_path_queries(user):
+    latest = TestAttempt.query.filter_by(user_id=user.id).order_by(TestAttempt.timestamp.desc()).first()
+    return {
+        'latest_results: newest attempt': TestAttempt.query.filter_by(
+            user_id=user.id).order_by(TestAttempt.timestamp.desc()).limit(1),
+        'results: attempt by id': TestAttempt.query.filter_by(id=latest.id, user_id=user.id),
+        'results: answers of attempt': TestAnswer.query.filter_by(attempt_id=latest.id),
+        'history: page after cursor': TestAttempt.query.filter_by(user_id=user.id).filter(
+            tuple_(TestAttempt.timestamp, TestAttempt.id) < (latest.timestamp, latest.id)).order_by(
+            TestAttempt.timestamp.desc(), TestAttempt.id.desc()).limit(HISTORY_PAGE_SIZE + 1),
+        'history: attempt count': db.session.query(func.count(TestAttempt.id)).filter(
+            TestAttempt.user_id == user.id),
+    }
+
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+    return [row[-1] for row in rows]
+
+
+def count_route_statements(user):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = app.test_client()
+    client.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+    with app.app_context():
+        latest_id = TestAttempt.query.filter_by(user_id=user.id).order_by(
+            TestAttempt.timestamp.desc()).first().id
+
+    routes = ['/results', f'/results/{latest_id}', '/history', f'/api/attempts/{latest_id}/answers']
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for route in routes:
+            statements.clear()
+            start = time.perf_counter()
+            response = client.get(route)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f'  {route:<32} {response.status_code}  {len(statements):3d} statements  {elapsed:8.1f}ms')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query plans for the results/history routes.')
+    parser.add_argument('--attempts', type=int, default=5000, help='length of the seeded user history')
+    args = parser.parse_args()
+
+    with app.app_context():
+        user = seed(args.attempts)
+        print(f'{args.attempts} attempts in the seeded history, database in {DB_DIR}\n')
+        for name, query in hot_path_queries(user).items():
+            print(name)
+            for line in explain(query):
+                flag = '  <-- not indexed' if 'SCAN' in line or 'TEMP B-TREE' in line else ''
+                print(f'  {line}{flag}')
+        user_id = user.id
+
+    print('\nStatements per request')
+    with app.app_context():
+        count_route_statements(db.session.get(User, user_id))
+
+
+if __name__ == '__main__':
+    main()
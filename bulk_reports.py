@@ -0,0 +1,245 @@
+# Personalized reports for a whole cohort, rendered offline:
+#   python bulk_reports.py db -o reports.zip
+#   python bulk_reports.py Autism-Adult-Data.csv -o reports/ --format txt --workers 4
+#
+# Screenings are read in chunks (stored attempts through a streaming cursor,
+# or a CSV in the Autism-Adult-Data.csv layout) and rendered by a process pool,
+# a few chunks in flight at a time, so memory stays bounded however large the
+# cohort is. The HTML template is compiled once at import: forked workers
+# inherit it and never recompile. Reports are written as they come back, one
+# file per screening, into a directory or a .zip archive.
+#
+# HTML reports are self-contained and print cleanly, so "Save as PDF" from a
+# browser gives the PDF version. The txt format is the one
+# model_training.generate_personalized_report prints.
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+
+from jinja2 import Environment
+
+from features import ANSWER_COLUMNS, parse_record
+from model_training import personalized_report
+from recommendations import answer_mask, recommendation_block, general_recommendations
+from utils import chunked
+
+CHUNK_SIZE = 500
+# Chunks queued per worker; bounds memory while keeping every worker busy
+CHUNKS_PER_WORKER = 2
+FORMATS = ('html', 'txt')
+# Forked workers share the parent's compiled template; spawn recompiles it once per worker
+START_METHOD = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+
+REPORT_HTML = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Screening report: {{ name }}</title>
+<style>
+body { font-family: Arial, sans-serif; max-width: 48rem; margin: 2rem auto; color: #222; line-height: 1.45; }
+h1 { font-size: 1.5rem; margin-bottom: 0.25rem; }
+.meta { color: #666; margin-top: 0; }
+.score { font-size: 1.2rem; font-weight: bold; padding: 0.5rem 0.75rem; border-left: 4px solid #4a6fa5; background: #f3f6fa; }
+.score.positive { border-color: #c0392b; background: #fbeeed; }
+.question { page-break-inside: avoid; border-bottom: 1px solid #ddd; padding: 0.5rem 0; }
+.question h3 { font-size: 1rem; margin: 0; }
+.disclaimer { font-size: 0.85rem; color: #666; margin-top: 2rem; }
+@media print { body { margin: 0; } }
+</style>
+</head>
+<body>
+<h1>Personalized Analysis Report for {{ name }}</h1>
+<p class="meta">Screening {{ id }}{% if taken_at %}, {{ taken_at }}{% endif %}</p>
+<p class="score {{ 'positive' if result == 'Positive' else 'negative' }}">
+Score: {{ score }}%{% if result %} ({{ result }}){% endif %}</p>
+
+<h2>General Advice</h2>
+<ul>
+{% for rec in general_recommendations %}<li>{{ rec }}</li>
+{% endfor %}</ul>
+
+<h2>Question-Specific Advice</h2>
+{% for rec in question_recommendations %}<div class="question">
+<h3>{{ rec.question }}: {{ rec.description }}</h3>
+<p><strong>Your response:</strong> {{ rec.answer }}</p>
+<p>{{ rec.recommendation }}</p>
+</div>
+{% endfor %}
+<p class="disclaimer">This analysis is based on responses to the Autism Spectrum Quotient (AQ) questions.
+It is for informational purposes only and not a clinical diagnosis. Please consult with a qualified
+healthcare professional for proper evaluation and guidance.</p>
+</body>
+</html>
+'''
+
+report_template = Environment(autoescape=True).from_string(REPORT_HTML)
+
+
+def render_html(screening):
+    answers = screening['answers']
+    return report_template.render(
+        id=screening['id'],
+        name=screening['name'],
+        taken_at=screening['taken_at'],
+        score=screening['score'],
+        result=screening['result'],
+        general_recommendations=general_recommendations(screening['score']),
+        question_recommendations=recommendation_block(answer_mask(answers)),
+    )
+
+
+def render_txt(screening):
+    answers = {f'A{i}': answer for i, answer in enumerate(screening['answers'], start=1)}
+    return personalized_report(screening['name'], answers) + '\n'
+
+
+RENDERERS = {'html': render_html, 'txt': render_txt}
+
+
+def render_chunk(chunk, fmt):
+    # Runs in a pool worker; returns (file name, report) pairs
+    render = RENDERERS[fmt]
+    return [(f"report-{screening['id']}.{fmt}", render(screening)) for screening in chunk]
+
+
+def screening_from_row(row):
+    answers = [int(getattr(row, column)) for column in ANSWER_COLUMNS]
+    return {
+        'id': row.id,
+        'name': row.full_name,
+        'taken_at': row.timestamp.strftime('%Y-%m-%d %H:%M') if row.timestamp else None,
+        'answers': answers,
+        'score': row.score if row.score is not None else sum(answers) * 10,
+        'result': row.result,
+    }
+
+
+def screening_from_record(record, index):
+    answers = [int(record[column] or 0) for column in ANSWER_COLUMNS]
+    screening_id = int(record['id']) if record.get('id') is not None else index
+    asd = record.get('Class/ASD')
+    return {
+        'id': screening_id,
+        'name': record.get('name') or f'Participant {screening_id}',
+        'taken_at': None,
+        'answers': answers,
+        'score': sum(answers) * 10,
+        'result': {'YES': 'Positive', 'NO': 'Negative'}.get(asd),
+    }
+
+
+def iter_db_chunks(chunk_size=CHUNK_SIZE):
+    # Must be called inside an application context
+    from export_data import iter_screening_chunks, screenings_query
+    from models import User, TestAttempt
+
+    # Reports cover every attempt, however it was scored
+    query = (screenings_query(model_labels=True)
+             .add_columns(User.full_name, TestAttempt.timestamp, TestAttempt.score)
+             # screenings_query() already groups by "user".id; the name is
+             # grouped explicitly as well, like its other user columns
+             .group_by(User.full_name))
+    return iter_screening_chunks(chunk_size, query=query, convert=screening_from_row)
+
+
+def iter_csv_chunks(path, chunk_size=CHUNK_SIZE):
+    with open(path, newline='', encoding='utf-8') as f:
+        screenings = (screening_from_record(parse_record(row), index)
+                      for index, row in enumerate(csv.DictReader(f), start=1))
+        yield from chunked(screenings, chunk_size)
+
+
+class DirectoryWriter:
+    """Writes each report as a file in a directory."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, name, content):
+        with open(os.path.join(self.path, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def close(self):
+        pass
+
+
+class ZipWriter:
+    """Appends each report to a .zip archive as it arrives."""
+
+    def __init__(self, path):
+        self.path = path
+        self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, name, content):
+        self.archive.writestr(name, content)
+
+    def close(self):
+        self.archive.close()
+
+
+def open_writer(path):
+    return ZipWriter(path) if path.endswith('.zip') else DirectoryWriter(path)
+
+
+def write_reports(writer, reports):
+    for name, content in reports:
+        writer.write(name, content)
+    return len(reports)
+
+
+def render_all(chunks, writer, fmt='html', workers=None):
+    # Returns the number of reports written
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        return sum(write_reports(writer, render_chunk(chunk, fmt)) for chunk in chunks)
+
+    count = 0
+    # The pool forks every worker up front, before the first chunk opens a
+    # database connection that the workers must not inherit
+    with multiprocessing.get_context(START_METHOD).Pool(workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.apply_async(render_chunk, (chunk, fmt)))
+            # Written in submission order, so the output order is stable
+            if len(in_flight) >= workers * CHUNKS_PER_WORKER:
+                count += write_reports(writer, in_flight.popleft().get())
+        while in_flight:
+            count += write_reports(writer, in_flight.popleft().get())
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render personalized reports for many screenings.')
+    parser.add_argument('source', help="a CSV in the Autism-Adult-Data.csv layout, or 'db' for stored attempts")
+    parser.add_argument('-o', '--output', required=True, help='directory, or .zip archive, to write')
+    parser.add_argument('--format', choices=FORMATS, default='html')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='rendering processes (1 renders inline)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    writer = open_writer(args.output)
+    try:
+        if args.source == 'db':
+            from app import app
+
+            with app.app_context():
+                count = render_all(iter_db_chunks(args.chunk_size), writer, args.format, args.workers)
+        else:
+            count = render_all(iter_csv_chunks(args.source, args.chunk_size), writer, args.format, args.workers)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f'Wrote {count} {args.format} reports to {args.output} in {elapsed:.2f}s '
+          f'({count / elapsed:.0f} reports/s, {args.workers} workers)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
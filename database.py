@@ -0,0 +1,60 @@
+# Engine settings for serving from several workers. Every pooled SQLite
+# connection is switched to WAL (readers no longer block the writer) and given
+# a busy timeout, so a writer waits for the lock instead of failing with
+# "database is locked". Other databases get a sized, pre-pinged pool.
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+# Seconds before a pooled connection is replaced (server-side databases only)
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+# NORMAL is durable across application crashes in WAL mode; only a power loss
+# can drop the last transactions
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+if SQLITE_SYNCHRONOUS not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+    raise ValueError(f'Invalid SQLITE_SYNCHRONOUS: {SQLITE_SYNCHRONOUS}')
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+def engine_options(uri):
+    # For app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    if not uri:
+        return {}
+    if is_sqlite(uri):
+        if is_memory_sqlite(uri):
+            # One connection per thread; there is nothing to pool
+            return {}
+        # pysqlite's own timeout is the busy handler until the pragma runs
+        return {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW, 'pool_timeout': DB_POOL_TIMEOUT,
+                'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW, 'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE, 'pool_pre_ping': True}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS:d}')
+        cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine):
+    # Call before the engine hands out its first connection
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', set_sqlite_pragmas)
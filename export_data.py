@@ -0,0 +1,157 @@
+# Streams stored screenings out of the database in the Autism-Adult-Data.csv
+# layout, for retraining on production data:
+#   python export_data.py -o screenings.csv
+#   python export_data.py -o screenings.parquet --chunk-size 10000
+#   python export_data.py -o screenings.csv --include-model-labels
+#
+# One row per attempt with all ten answers, pivoted in SQL and read through a
+# streaming cursor in chunks, so memory stays bounded however many attempts the
+# database holds. Gender, jaundice, family history and relation come from the
+# demographics form, stored with each attempt; the web flow does not ask for
+# ethnicity or country, so those (and demographics of attempts where the form
+# was skipped) are left empty and imputed at training time like missing values
+# in the bundled CSVs. Class/ASD is the result recorded for the attempt.
+#
+# Attempts scored by a model record its version, and their result is that
+# model's own prediction: training on them would fit the model to itself. They
+# are left out unless --include-model-labels is given. The remaining attempts
+# were scored with the AQ-10 cut-off (score of 7 or more), the rule the bundled
+# datasets' Class/ASD follows. A trailing model_version column tells the two
+# apart; it is not part of the training layout and model_training.py --append
+# ignores it.
+import argparse
+import csv
+import sys
+import time
+
+from sqlalchemy import case, func, select
+
+from features import ANSWER_COLUMNS, CSV_COLUMNS, GENDER_CODES, RELATION_CODES
+from models import db, User, TestAttempt, TestAnswer
+
+CHUNK_SIZE = 5000
+EXPORT_COLUMNS = CSV_COLUMNS + ['model_version']
+
+
+def screenings_query(model_labels=False):
+    # With model_labels=False, attempts whose result came from a model are skipped
+    answer_columns = [
+        func.max(case((TestAnswer.question_id == q_num, TestAnswer.answer))).label(column)
+        for q_num, column in enumerate(ANSWER_COLUMNS, start=1)
+    ]
+    query = (
+        select(TestAttempt.id, User.age, TestAttempt.result, TestAttempt.model_version,
+               TestAttempt.gender, TestAttempt.jaundice, TestAttempt.autism_family, TestAttempt.relation,
+               *answer_columns)
+        .join(User, User.id == TestAttempt.user_id)
+        .join(TestAnswer, TestAnswer.attempt_id == TestAttempt.id)
+        # Every selected column must be grouped or depend on a grouped key for PostgreSQL
+        .group_by(TestAttempt.id, User.id, User.age)
+        # Attempts interrupted before the tenth answer are not usable for training
+        .having(func.count(TestAnswer.id) == len(ANSWER_COLUMNS))
+        .order_by(TestAttempt.id)
+    )
+    return query if model_labels else query.where(TestAttempt.model_version.is_(None))
+
+
+def yes_no(flag):
+    return None if flag is None else ('yes' if flag else 'no')
+
+
+def to_record(row):
+    answers = [int(getattr(row, column)) for column in ANSWER_COLUMNS]
+    record = dict.fromkeys(EXPORT_COLUMNS)
+    record.update(zip(ANSWER_COLUMNS, answers))
+    record['id'] = row.id
+    record['age'] = None if row.age is None else float(row.age)
+    # Coded as predictor.record_from_form codes them for the model
+    record['gender'] = GENDER_CODES.get(row.gender)
+    record['jundice'] = yes_no(row.jaundice)
+    record['austim'] = yes_no(row.autism_family)
+    if row.relation is not None:
+        record['relation'] = RELATION_CODES.get(row.relation, 'Other')
+    record['result'] = sum(answers)
+    record['Class/ASD'] = 'YES' if row.result == 'Positive' else 'NO'
+    record['model_version'] = row.model_version
+    return record
+
+
+def iter_screening_chunks(chunk_size=CHUNK_SIZE, query=None, convert=to_record):
+    # Must be called inside an application context. Lists of up to chunk_size
+    # records, read from a streaming cursor rather than fetched all at once.
+    # query defaults to screenings_query(); convert turns each row into a record
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(
+            screenings_query() if query is None else query)
+        for rows in result.partitions():
+            yield [convert(row) for row in rows]
+
+
+def iter_screenings(chunk_size=CHUNK_SIZE, model_labels=False):
+    for chunk in iter_screening_chunks(chunk_size, screenings_query(model_labels)):
+        yield from chunk
+
+
+def write_csv(chunks, out):
+    writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for chunk in chunks:
+        writer.writerows({key: '?' if value is None else value for key, value in record.items()}
+                         for record in chunk)
+        count += len(chunk)
+    return count
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    types = {'id': pa.int64(), 'age': pa.float64(), 'result': pa.int64()}
+    types.update(dict.fromkeys(ANSWER_COLUMNS, pa.int8()))
+    return pa.schema([(column, types.get(column, pa.string())) for column in EXPORT_COLUMNS])
+
+
+def write_parquet(chunks, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Parquet export needs pyarrow (pip install pyarrow); use a .csv output instead')
+
+    schema = parquet_schema()
+    count = 0
+    # Each chunk becomes one row group, so the file is never held in memory
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export stored screenings for training.')
+    parser.add_argument('-o', '--output', help='.csv or .parquet file to write (default: CSV on stdout)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--include-model-labels', action='store_true',
+                        help="also export attempts whose Class/ASD is a model's prediction")
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    start = time.perf_counter()
+    with app.app_context():
+        chunks = iter_screening_chunks(args.chunk_size, screenings_query(args.include_model_labels))
+        if args.output and args.output.endswith('.parquet'):
+            count = write_parquet(chunks, args.output)
+        elif args.output:
+            with open(args.output, 'w', newline='', encoding='utf-8') as out:
+                count = write_csv(chunks, out)
+        else:
+            count = write_csv(chunks, sys.stdout)
+
+    elapsed = time.perf_counter() - start
+    print(f'Exported {count} screenings in {elapsed:.2f}s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
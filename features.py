@@ -0,0 +1,182 @@
+# Preprocessing shared by training and serving.
+# model_training.py fits the pandas pipeline (imputation, x12 age conversion,
+# MinMax scaling, country/relation bucketing, get_dummies, SelectKBest) and
+# captures the fitted state here; the web app replays it with plain NumPy.
+import joblib
+import numpy as np
+
+PIPELINE_VERSION = 1
+
+ANSWER_COLUMNS = [f'A{i}_Score' for i in range(1, 11)]
+NUMERIC_COLUMNS = ['Age_Mons', 'result']
+CATEGORICAL_COLUMNS = ['gender', 'ethnicity', 'jundice', 'austim', 'contry_of_res', 'relation']
+
+# Grouping applied in model_training.py before one-hot encoding
+TOP_COUNTRIES = ['United States', 'United Kingdom', 'India']
+TOP_RELATIONS = ['Parent', 'Self', 'Relative']
+
+# Values posted by demographics.html mapped onto the training categories
+GENDER_CODES = {'male': 'm', 'female': 'f'}
+RELATION_CODES = {'self': 'Self', 'parent': 'Parent', 'relative': 'Relative'}
+
+# Column order of Autism-Adult-Data.csv
+CSV_COLUMNS = ['id'] + ANSWER_COLUMNS + ['age', 'gender', 'ethnicity', 'jundice', 'austim',
+                                         'contry_of_res', 'used_app_before', 'result',
+                                         'age_desc', 'relation', 'Class/ASD']
+# Fields of the CSV layout parsed as numbers
+NUMERIC_FIELDS = ANSWER_COLUMNS + ['age', 'result']
+# pandas.read_csv's default missing-value strings plus the '?' the datasets use
+NA_VALUES = {'', '?', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+             '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+# age_desc of the children's dataset, whose "Others" ethnicity is kept as is
+CHILD_AGE_DESC = '4-11 years'
+CHILD_MAX_AGE = 11
+
+
+def is_child(record):
+    age_desc = record.get('age_desc')
+    if age_desc is not None:
+        return age_desc == CHILD_AGE_DESC
+    age = record.get('age')
+    return age is not None and age <= CHILD_MAX_AGE
+
+
+def parse_record(row):
+    # Reads a CSV row the way load_source() and clean_source() in
+    # model_training.py do. Strings are not stripped: read_csv keeps
+    # "Middle Eastern " with its trailing space and so does the vocabulary.
+    record = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        if isinstance(value, str) and value in NA_VALUES:
+            value = None
+        if value is not None and key in NUMERIC_FIELDS:
+            value = float(value)
+        record[key] = value
+    if record.get('relation') == 'self':
+        record['relation'] = 'Self'
+    if record.get('ethnicity') == 'Others' and not is_child(record):
+        record['ethnicity'] = 'others'
+    return record
+
+
+def bucket_country(country):
+    return country if country in TOP_COUNTRIES else 'Other'
+
+
+def bucket_relation(relation):
+    return relation if relation in TOP_RELATIONS else 'Other'
+
+
+class FeaturePipeline:
+    """Fitted preprocessing state plus a NumPy-only transform for one or many records.
+
+    Records use the column layout of Autism-Adult-Data.csv: ``A1_Score`` ..
+    ``A10_Score``, ``age`` (years), ``gender``, ``ethnicity``, ``jundice``,
+    ``austim``, ``contry_of_res``, ``relation`` and optionally ``result``.
+    """
+
+    def __init__(self, columns, scale_min, scale_max, fill_values, support):
+        self.columns = list(columns)
+        self.scale_min = np.asarray(scale_min, dtype=np.float64)
+        self.scale_max = np.asarray(scale_max, dtype=np.float64)
+        self.fill_values = dict(fill_values)
+        self.support = np.asarray(support, dtype=bool)
+
+        self.selected = np.flatnonzero(self.support)
+        self.n_features = len(self.selected)
+        # Names of the columns transform() returns, in order
+        self.selected_columns = [self.columns[i] for i in self.selected]
+
+        # Column positions resolved once so transform() is just index writes
+        position = {name: i for i, name in enumerate(self.columns)}
+        self._answer_idx = np.array([position[c] for c in ANSWER_COLUMNS])
+        self._numeric_idx = np.array([position[c] for c in NUMERIC_COLUMNS])
+        self._category_idx = {
+            (field, name[len(field) + 1:]): i
+            for i, name in enumerate(self.columns)
+            for field in CATEGORICAL_COLUMNS
+            if name.startswith(field + '_')
+        }
+        # MinMaxScaler leaves constant columns unscaled
+        span = self.scale_max - self.scale_min
+        self._scale = 1.0 / np.where(span == 0, 1.0, span)
+
+    @classmethod
+    def from_training(cls, dummy_columns, scaler, selector, cleaned):
+        # cleaned is the imputed, combined frame (Age_Mons already in months)
+        fill_values = {field: cleaned[field].mode()[0] for field in CATEGORICAL_COLUMNS}
+        fill_values['Age_Mons'] = float(cleaned['Age_Mons'].mean())
+        return cls(
+            columns=dummy_columns,
+            scale_min=scaler.data_min_,
+            scale_max=scaler.data_max_,
+            fill_values=fill_values,
+            support=selector.get_support(),
+        )
+
+    def _categories(self, record):
+        for field in CATEGORICAL_COLUMNS:
+            value = record.get(field)
+            if value is None:
+                value = self.fill_values[field]
+            if field == 'contry_of_res':
+                value = bucket_country(value)
+            elif field == 'relation':
+                value = bucket_relation(value)
+            yield field, value
+
+    def _fill(self, row, record):
+        answers = [int(record.get(c) or 0) for c in ANSWER_COLUMNS]
+        row[self._answer_idx] = answers
+
+        age = record.get('age')
+        age_mons = self.fill_values['Age_Mons'] if age is None else float(age) * 12
+        result = record.get('result')
+        result = sum(answers) if result is None else float(result)
+        row[self._numeric_idx] = (np.array([age_mons, result]) - self.scale_min) * self._scale
+
+        # Categories never seen in training leave every dummy of that field at 0,
+        # exactly like get_dummies() + reindex would
+        for key in self._categories(record):
+            idx = self._category_idx.get(key)
+            if idx is not None:
+                row[idx] = 1.0
+
+    def transform(self, record):
+        row = np.zeros(len(self.columns))
+        self._fill(row, record)
+        return row[self.selected].reshape(1, -1)
+
+    def transform_many(self, records):
+        records = list(records)
+        out = np.zeros((len(records), len(self.columns)))
+        for row, record in zip(out, records):
+            self._fill(row, record)
+        return out[:, self.selected]
+
+    def to_dict(self):
+        return {
+            'version': PIPELINE_VERSION,
+            'columns': self.columns,
+            'scale_min': self.scale_min.tolist(),
+            'scale_max': self.scale_max.tolist(),
+            'fill_values': self.fill_values,
+            'support': self.support.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != PIPELINE_VERSION:
+            raise ValueError(f"Unsupported feature pipeline version: {data.get('version')}")
+        return cls(data['columns'], data['scale_min'], data['scale_max'],
+                   data['fill_values'], data['support'])
+
+    def save(self, path):
+        # Stored as plain lists/dicts so loading does not depend on this class's layout
+        joblib.dump(self.to_dict(), path)
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_dict(joblib.load(path))
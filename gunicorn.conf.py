@@ -0,0 +1,26 @@
+# gunicorn -c gunicorn.conf.py
+# With preload_app the app (and with it the model in predictor.py) is imported
+# once in the master and inherited by every worker instead of being unpickled
+# per worker. Set GUNICORN_PRELOAD=0 to load it in each worker instead, e.g.
+# to pick up code and model changes with a graceful reload (HUP); the master
+# then never imports the app.
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Threads overlap request I/O; SQLite writes across all of them are serialized
+# by WAL's single writer lock and wait up to SQLITE_BUSY_TIMEOUT_MS for it
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+
+def pre_fork(server, worker):
+    # Without preload_app the master never imports the app; importing predictor
+    # here would load the model into it and every worker would reuse that copy
+    if not server.cfg.preload_app:
+        return
+    from predictor import preload
+    preload()
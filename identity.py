@@ -0,0 +1,214 @@
+# Identity layer: password hashing and per-request user loading.
+#
+# Password hashing is the one CPU-heavy step of a request. It runs on the
+# request thread (hashlib releases the GIL while hashing), but only
+# HASH_CONCURRENCY hashes run at once across all WEB_CONCURRENCY worker
+# processes, so a burst of logins leaves cores for other requests; logins
+# beyond that wait up to HASH_QUEUE_TIMEOUT and are then refused. Stored
+# hashes made with an older or weaker scheme are upgraded to
+# PASSWORD_HASH_METHOD on the next successful login. load_user() is answered from a short-lived in-process
+# cache instead of a SELECT on every authenticated request, and username
+# availability checks from an in-memory index of taken usernames.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from models import db, User
+from utils import PerProcess
+
+# Any werkzeug method string, e.g. "pbkdf2:sha256:1000000" or "scrypt:131072:8:1".
+# Parameters left out take werkzeug's current defaults.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+# Hashes computed at once on this host, shared equally by the worker processes
+# (at least one each, so the total can exceed this with more workers than that)
+HASH_CONCURRENCY = int(os.getenv('HASH_CONCURRENCY', max(1, (os.cpu_count() or 2) // 2)))
+# Worker processes sharing the host; gunicorn.conf.py reads the same variable
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+# Seconds a login waits for a hashing slot before it is refused
+HASH_QUEUE_TIMEOUT = float(os.getenv('HASH_QUEUE_TIMEOUT', 10))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 4096))
+# How stale a worker's username index may get with respect to registrations
+# handled by other workers
+USERNAME_REFRESH_SECONDS = float(os.getenv('USERNAME_REFRESH_SECONDS', 5))
+
+SCRYPT_DEFAULTS = '32768:8:1'
+
+
+class HashingBusy(Exception):
+    """Every hashing slot stayed busy; the caller should ask the user to retry."""
+
+
+def normalize_method(method):
+    # The method prefix werkzeug writes into a hash made with this method
+    name, *params = method.split(':')
+    if name == 'pbkdf2':
+        digest = params[0] if params else 'sha256'
+        iterations = params[1] if len(params) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{digest}:{iterations}'
+    if name == 'scrypt':
+        return 'scrypt:' + (':'.join(params) if params else SCRYPT_DEFAULTS)
+    return method
+
+
+def needs_rehash(stored, method=PASSWORD_HASH_METHOD):
+    return stored.split('$', 1)[0] != normalize_method(method)
+
+
+class HashingLimit:
+    """Lets at most ``slots`` request threads of this process hash at once."""
+
+    def __init__(self, slots=None, timeout=HASH_QUEUE_TIMEOUT, method=PASSWORD_HASH_METHOD):
+        self.slots = slots or max(1, HASH_CONCURRENCY // WEB_CONCURRENCY)
+        self.timeout = timeout
+        self.method = method
+        self.rejected = 0
+        # Not inherited from a preloading master: each worker counts its own
+        self._semaphore = PerProcess(lambda: threading.BoundedSemaphore(self.slots))
+
+    def run(self, fn, *args):
+        semaphore = self._semaphore.get()
+        if not semaphore.acquire(timeout=self.timeout):
+            self.rejected += 1
+            raise HashingBusy()
+        try:
+            return fn(*args)
+        finally:
+            semaphore.release()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, stored, password):
+        return self.run(check_password_hash, stored, password)
+
+
+class UserCache:
+    """TTL cache of users for Flask-Login's user_loader.
+
+    Entries are detached copies without the password hash; each request gets
+    its own session-bound instance through ``merge(load=False)``, which issues
+    no SQL, so relationships still lazy-load normally.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if self.ttl <= 0:
+            return db.session.get(User, user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return db.session.merge(entry[1], load=False)
+            self.misses += 1
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, snapshot(user))
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None}
+
+
+class UsernameIndex:
+    """Set of taken usernames for keystroke-rate availability checks.
+
+    Warmed from the user table at startup and updated on registration. Users
+    registered through other workers are picked up by an incremental
+    ``id > last seen`` query at most every ``refresh`` seconds. Answers are
+    advisory: User.username's unique constraint stays the source of truth.
+    """
+
+    def __init__(self, refresh=USERNAME_REFRESH_SECONDS):
+        self.refresh = refresh
+        self._names = set()
+        self._last_id = 0
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def warm(self):
+        # Must be called inside an application context
+        rows = db.session.execute(
+            select(User.id, User.username).where(User.id > self._last_id).order_by(User.id)
+        ).all()
+        with self._lock:
+            for user_id, username in rows:
+                self._names.add(username)
+                self._last_id = max(self._last_id, user_id)
+            self._checked = time.monotonic()
+
+    def is_taken(self, username):
+        now = time.monotonic()
+        with self._lock:
+            # One request refreshes; the others answer from the set meanwhile
+            stale = now - self._checked >= self.refresh
+            if stale:
+                self._checked = now
+        if stale:
+            self.warm()
+        return username in self._names
+
+    def add(self, username):
+        with self._lock:
+            self._names.add(username)
+
+    def __len__(self):
+        return len(self._names)
+
+
+def snapshot(user):
+    copy = User(**{
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(User).column_attrs
+        if attr.key != 'password'
+    })
+    make_transient_to_detached(copy)
+    return copy
+
+
+hashing = HashingLimit()
+user_cache = UserCache()
+usernames = UsernameIndex()
+
+
+def hash_password(password):
+    return hashing.hash(password)
+
+
+def authenticate(username, password):
+    """Returns the user for valid credentials, else None. Raises HashingBusy."""
+    user = User.query.filter_by(username=username).first()
+    if user is None or not hashing.verify(user.password, password):
+        return None
+    if needs_rehash(user.password, hashing.method):
+        # The plaintext is only available now, so this is when an old hash
+        # can be upgraded
+        user.password = hashing.hash(password)
+        db.session.commit()
+        user_cache.invalidate(user.id)
+    return user
@@ -0,0 +1,211 @@
+# Request instrumentation. Every request records its latency per route, plus
+# where the time went: SQL statements (count and time), template rendering,
+# and any block wrapped in timed(), e.g. model inference. Served in the
+# Prometheus text format at /metrics. With SERVER_TIMING=1 every response also
+# carries a Server-Timing header, which browser dev tools show per request.
+#
+# Requests are recorded on teardown, so unhandled exceptions count as 500s.
+# Streamed responses are recorded when the response is closed, after the last
+# chunk is sent; their Server-Timing header only covers the time to headers.
+#
+# Metrics are kept per process: with several gunicorn workers each scrape is
+# answered by whichever worker takes it.
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', '0') == '1'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Anything else is recorded as "other" so clients cannot invent label values
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per combination of label values."""
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> per-bucket counts (not cumulative), then sum and count
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted((key, list(series)) for key, series in self._series.items())
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for label_values, series in snapshot:
+            labels = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return lines
+
+
+class RequestTimings:
+    """Where one request spent its time, kept on flask.g while it runs."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.statements = 0
+        # Set by after_request; still None on teardown after an unhandled exception
+        self.status = None
+        self.streamed = False
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+
+def current():
+    # The running request's timings, or None outside a request
+    return g.get('request_timings') if has_request_context() else None
+
+
+@contextmanager
+def timed(phase):
+    # Adds the time spent in the block to the current request's phase
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current()
+        if timings is not None:
+            timings.add(phase, time.perf_counter() - start)
+
+
+class Instrumentation:
+    """Flask hooks and SQLAlchemy listeners feeding the request histograms."""
+
+    def __init__(self, server_timing=SERVER_TIMING):
+        self.server_timing = server_timing
+        self.requests = Histogram('http_request_duration_seconds', 'Request latency by route.',
+                                  ('method', 'route', 'status'), LATENCY_BUCKETS)
+        self.phases = Histogram('http_request_phase_seconds',
+                                'Time spent per request in SQL, templates, inference and other phases.',
+                                ('route', 'phase'), LATENCY_BUCKETS)
+        self.statements = Histogram('http_request_sql_statements', 'SQL statements executed per request.',
+                                    ('route',), STATEMENT_BUCKETS)
+
+    def init_app(self, app):
+        # Registered before the app's own hooks so their time is included
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._statement_started)
+        event.listen(engine, 'after_cursor_execute', self._statement_finished)
+        event.listen(engine, 'handle_error', self._statement_failed)
+
+    def _start(self):
+        g.request_timings = RequestTimings()
+
+    def _finish(self, response):
+        timings = current()
+        if timings is None:
+            return response
+        timings.status = response.status_code
+        if response.is_streamed:
+            timings.streamed = True
+            response.call_on_close(partial(self._record, timings, *self._labels()))
+
+        if self.server_timing:
+            elapsed = time.perf_counter() - timings.start
+            entries = [f'total;dur={elapsed * 1000:.2f}']
+            for phase, seconds in timings.phases.items():
+                entry = f'{phase};dur={seconds * 1000:.2f}'
+                if phase == 'db':
+                    entry += f';desc="{timings.statements} statements"'
+                entries.append(entry)
+            response.headers['Server-Timing'] = ', '.join(entries)
+        return response
+
+    def _teardown(self, exception):
+        # Teardown runs before a streamed body is generated; its timings stay
+        # on g so timed() blocks run while streaming still count
+        timings = current()
+        if timings is not None and not timings.streamed:
+            self._record(g.pop('request_timings'), *self._labels())
+
+    def _labels(self):
+        method = request.method if request.method in METHODS else 'other'
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        return method, route
+
+    def _record(self, timings, method, route):
+        elapsed = time.perf_counter() - timings.start
+        status = timings.status if timings.status is not None else 500
+        self.requests.observe(elapsed, method, route, str(status))
+        self.statements.observe(timings.statements, route)
+        for phase, seconds in timings.phases.items():
+            self.phases.observe(seconds, route, phase)
+
+    def _template_started(self, sender, template, context, **extra):
+        timings = current()
+        if timings is not None:
+            timings.template_start = time.perf_counter()
+
+    def _template_finished(self, sender, template, context, **extra):
+        timings = current()
+        start = getattr(timings, 'template_start', None)
+        if start is not None:
+            timings.add('template', time.perf_counter() - start)
+            timings.template_start = None
+
+    # Statement start times are kept on the connection, as in SQLAlchemy's
+    # query profiling recipe
+    def _statement_started(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _statement_finished(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        timings = current()
+        if timings is not None:
+            timings.statements += 1
+            timings.add('db', elapsed)
+
+    def _statement_failed(self, exception_context):
+        starts = exception_context.connection.info.get('query_start') if exception_context.connection else None
+        if starts:
+            starts.pop()
+
+    def metrics(self):
+        lines = self.requests.render() + self.phases.render() + self.statements.render()
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+instrumentation = Instrumentation()
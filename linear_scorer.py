@@ -0,0 +1,214 @@
+# Serving form of a linear model: a weight vector, a bias and the probability
+# calibration, scored with one NumPy dot product. model_training.py exports it
+# next to autism_model.pkl whenever the fitted model is linear; predictor.py
+# serves it instead of the pickled SVC, which would otherwise evaluate every
+# support vector per prediction.
+#   python linear_scorer.py      # export from the current autism_model.pkl
+import hashlib
+import os
+import sys
+
+import joblib
+import numpy as np
+
+SCORER_VERSION = 1
+
+# Pairwise probabilities are clipped to this range by libsvm
+MIN_PROB = 1e-7
+# Up to this many rows, coupling runs on Python floats rather than arrays
+SMALL_BATCH = 8
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sigmoid_predict(decision, a, b):
+    # libsvm's numerically stable 1 / (1 + exp(a * decision + b))
+    fApB = a * decision + b
+    e = np.exp(-np.abs(fApB))
+    return np.where(fApB >= 0, e / (1.0 + e), 1.0 / (1.0 + e))
+
+
+def couple_one(r):
+    # couple_binary() for a single row with Python floats: the web flow scores
+    # one screening at a time, where NumPy's per-call overhead would dominate
+    eps = 0.005 / 2
+    Q = ((1 - r) * (1 - r), -(1 - r) * r), (-(1 - r) * r, r * r)
+    p = [0.5, 0.5]
+    for _ in range(100):
+        Qp = [Q[0][0] * p[0] + Q[0][1] * p[1], Q[1][0] * p[0] + Q[1][1] * p[1]]
+        pQp = p[0] * Qp[0] + p[1] * Qp[1]
+        if max(abs(Qp[0] - pQp), abs(Qp[1] - pQp)) < eps:
+            break
+        for t in (0, 1):
+            diff = (-Qp[t] + pQp) / Q[t][t]
+            p[t] += diff
+            pQp = (pQp + diff * (diff * Q[t][t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+            for j in (0, 1):
+                Qp[j] = (Qp[j] + diff * Q[t][j]) / (1 + diff)
+                p[j] /= 1 + diff
+    return p[0]
+
+
+def couple_binary(r):
+    # libsvm's multiclass_probability() for two classes, vectorized over rows.
+    # It iterates from p = (0.5, 0.5) and stops once within 0.005 / k, so
+    # SVC.predict_proba is not exactly the Platt sigmoid; replaying it keeps the
+    # scorer's probabilities (and the >= 0.5 verdict) identical to the SVC's.
+    # The 2x2 matrix products are written out, in libsvm's operation order.
+    eps = 0.005 / 2
+    Q00, Q01, Q11 = (1 - r) * (1 - r), -(1 - r) * r, r * r
+    p0 = np.full(len(r), 0.5)
+    p1 = np.full(len(r), 0.5)
+    active = np.ones(len(r), dtype=bool)
+    for _ in range(100):
+        Qp0 = Q00 * p0 + Q01 * p1
+        Qp1 = Q01 * p0 + Q11 * p1
+        pQp = p0 * Qp0 + p1 * Qp1
+        active &= np.maximum(np.abs(Qp0 - pQp), np.abs(Qp1 - pQp)) >= eps
+        if not active.any():
+            break
+        for Qtt, Qt0, Qt1, first in ((Q00, Q00, Q01, True), (Q11, Q01, Q11, False)):
+            Qpt = Qp0 if first else Qp1
+            diff = np.where(active, (-Qpt + pQp) / Qtt, 0.0)
+            if first:
+                p0 = p0 + diff
+            else:
+                p1 = p1 + diff
+            pQp = (pQp + diff * (diff * Qtt + 2 * Qpt)) / (1 + diff) / (1 + diff)
+            Qp0 = (Qp0 + diff * Qt0) / (1 + diff)
+            Qp1 = (Qp1 + diff * Qt1) / (1 + diff)
+            p0 = p0 / (1 + diff)
+            p1 = p1 / (1 + diff)
+    return p0
+
+
+class LinearScorer:
+    """Drop-in for a fitted binary linear classifier's predict_proba.
+
+    The first class's probability is ``1 / (1 + exp(prob_a * d + prob_b))``
+    with ``d = -(X @ coef + intercept)``. A linear SVC stores its Platt
+    parameters in that form (``coupled`` replays libsvm's coupling step); a
+    logistic model is ``prob_a = -1, prob_b = 0`` without coupling.
+    """
+
+    def __init__(self, coef, intercept, prob_a, prob_b, coupled, classes=(0, 1), source=None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.prob_a = float(prob_a)
+        self.prob_b = float(prob_b)
+        self.coupled = bool(coupled)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = len(self.coef)
+        # Digest of the pickled model this was exported from
+        self.source = source
+
+    @classmethod
+    def from_estimator(cls, model, source=None):
+        from sklearn.svm import SVC
+
+        if len(model.classes_) != 2 or not hasattr(model, 'coef_'):
+            raise ValueError(f'{type(model).__name__} is not a binary linear classifier')
+        if isinstance(model, SVC):
+            # probA_/probB_ are deprecated along with SVC(probability=True)
+            prob_a, prob_b = model._probA[0], model._probB[0]
+            coupled = True
+        elif getattr(model, 'loss', None) == 'log_loss':
+            prob_a, prob_b, coupled = -1.0, 0.0, False
+        else:
+            raise ValueError(f'{type(model).__name__} has no probability calibration to export')
+        return cls(model.coef_[0], model.intercept_[0], prob_a, prob_b, coupled,
+                   model.classes_, source)
+
+    def decision_function(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        first = sigmoid_predict(-self.decision_function(X), self.prob_a, self.prob_b)
+        if self.coupled:
+            first = np.clip(first, MIN_PROB, 1 - MIN_PROB)
+            if len(first) <= SMALL_BATCH:
+                first = np.array([couple_one(r) for r in first.tolist()])
+            else:
+                first = couple_binary(first)
+        return np.column_stack([first, 1 - first])
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+    def check_parity(self, model, X, atol=1e-9):
+        # Raises if the scorer does not reproduce model.predict_proba on X
+        expected = model.predict_proba(X)
+        error = np.abs(self.predict_proba(X) - expected).max() if len(X) else 0.0
+        if error > atol:
+            raise ValueError(f'Linear scorer diverges from {type(model).__name__}.predict_proba by {error:.3g}')
+        return error
+
+    def to_dict(self):
+        return {
+            'version': SCORER_VERSION,
+            'coef': self.coef.tolist(),
+            'intercept': self.intercept,
+            'prob_a': self.prob_a,
+            'prob_b': self.prob_b,
+            'coupled': self.coupled,
+            'classes': self.classes_.tolist(),
+            'source': self.source,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != SCORER_VERSION:
+            raise ValueError(f"Unsupported linear scorer version: {data.get('version')}")
+        return cls(data['coef'], data['intercept'], data['prob_a'], data['prob_b'],
+                   data['coupled'], data['classes'], data['source'])
+
+    def save(self, path):
+        # Plain lists/floats, like FeaturePipeline.save()
+        joblib.dump(self.to_dict(), path)
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_dict(joblib.load(path))
+
+
+def is_linear(model):
+    return getattr(model, 'kernel', 'linear') == 'linear' and hasattr(model, 'coef_')
+
+
+def export_scorer(model, model_path, path, X_check):
+    """Write the linear scorer for model, or remove a stale one.
+
+    model_path is the pickled model's file (its digest ties the two together);
+    X_check is the held-out split the parity check runs on.
+    """
+    if not is_linear(model):
+        if os.path.exists(path):
+            os.remove(path)
+        kernel = getattr(model, 'kernel', type(model).__name__)
+        print(f"WARNING: the {kernel} model is not linear, so no linear scorer was exported and any "
+              f"previous {path} was removed. Serving falls back to the pickled model, which evaluates every "
+              f"support vector per prediction. Retrain without model_training.py --any-kernel to keep "
+              f"the fast path.",
+              file=sys.stderr)
+        return None
+    scorer = LinearScorer.from_estimator(model, source=file_digest(model_path))
+    error = scorer.check_parity(model, X_check)
+    scorer.save(path)
+    print(f"Linear scorer saved ({os.path.getsize(path)} bytes, max |dp| = {error:.2g} on {len(X_check)} held-out rows)")
+    return scorer
+
+
+if __name__ == '__main__':
+    import model_training
+    from predictor import MODEL_PATH, LINEAR_MODEL_PATH
+
+    dataset = model_training.prepare()
+    _, X_test, _, _ = model_training.split(dataset.X, dataset.y)
+    if export_scorer(joblib.load(MODEL_PATH), MODEL_PATH, LINEAR_MODEL_PATH, X_test) is None:
+        print(f'{MODEL_PATH} is not linear; no scorer exported')
@@ -0,0 +1,85 @@
+# Brings an existing database (e.g. users.db created by an older app.py) up to
+# date with models.py. db.create_all() only creates missing tables, so indexes
+# and columns added to existing tables are applied here. Every step is
+# idempotent; app.py runs it on startup, or run it by hand:
+#   python migrations.py
+#
+# Without gunicorn's preload_app every worker runs it as it starts; a file lock
+# makes them take turns, so only the first one finds anything to do.
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+
+import rollups
+from models import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+SCHEMA_LOCK_FILE = os.getenv('SCHEMA_LOCK_FILE',
+                             os.path.join(tempfile.gettempdir(), 'autism-screening-schema.lock'))
+
+
+def add_missing_columns(connection):
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            # SQLite can only add nullable columns without a constant default
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+            ))
+
+
+def create_missing_indexes(connection):
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+@contextmanager
+def schema_lock(path=SCHEMA_LOCK_FILE):
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def upgrade_schema():
+    # Must be called inside an application context
+    with schema_lock():
+        _upgrade_schema()
+
+
+def _upgrade_schema():
+    existing_tables = set(inspect(db.engine).get_table_names())
+    db.create_all()
+    with db.engine.begin() as connection:
+        add_missing_columns(connection)
+        create_missing_indexes(connection)
+
+    # Rollup tables created just now start empty; backfill them from history
+    if 'test_attempt' in existing_tables and 'user_stats' not in existing_tables:
+        rollups.rebuild()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        upgrade_schema()
+        print(f"Schema up to date: {db.engine.url}")
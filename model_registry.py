@@ -0,0 +1,132 @@
+# Versioned model artifacts. Each published model lives in its own directory
+# named by its version (the first 12 hex digits of the model file's sha256):
+#
+#   models/<version>/autism_model.pkl, autism_pipeline.pkl, autism_linear.pkl
+#   models/<version>/metadata.json    training date, metrics, params, features
+#   models/CURRENT                    the active version
+#
+# model_training.py --publish adds a version and activates it; running
+# workers notice CURRENT change and swap models without a restart (see
+# predictor.ModelWatcher). Roll back with:
+#   python model_registry.py activate <version>
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+import joblib
+
+from linear_scorer import export_scorer, file_digest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', os.path.join(BASE_DIR, 'models'))
+
+MODEL_FILE = 'autism_model.pkl'
+PIPELINE_FILE = 'autism_pipeline.pkl'
+LINEAR_FILE = 'autism_linear.pkl'
+METADATA_FILE = 'metadata.json'
+CURRENT_FILE = 'CURRENT'
+
+
+def version_of(model_path):
+    return file_digest(model_path)[:12]
+
+
+class ModelRegistry:
+    """A directory of published model versions plus a pointer to the active one."""
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def path(self, version, name):
+        return os.path.join(self.root, version, name)
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, version):
+        with open(self.path(version, METADATA_FILE), encoding='utf-8') as f:
+            return json.load(f)
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        found = [self.metadata(name) for name in os.listdir(self.root)
+                 if os.path.exists(self.path(name, METADATA_FILE))]
+        return sorted(found, key=lambda meta: meta['trained_at'])
+
+    def publish(self, model, pipeline, metrics, params, X_check, activate=True):
+        # Artifacts are written to a scratch directory and renamed into place,
+        # so a watcher never sees a half-written version
+        os.makedirs(self.root, exist_ok=True)
+        scratch = os.path.join(self.root, f'.publish-{os.getpid()}')
+        shutil.rmtree(scratch, ignore_errors=True)
+        os.makedirs(scratch)
+        model_path = os.path.join(scratch, MODEL_FILE)
+        joblib.dump(model, model_path)
+        pipeline.save(os.path.join(scratch, PIPELINE_FILE))
+        export_scorer(model, model_path, os.path.join(scratch, LINEAR_FILE), X_check)
+
+        version = version_of(model_path)
+        metadata = {
+            'version': version,
+            'trained_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'model': type(model).__name__,
+            'params': {name: value for name, value in params.items()
+                       if isinstance(value, (str, int, float, bool, type(None)))},
+            'metrics': metrics,
+            'features': [pipeline.columns[i] for i in pipeline.selected],
+        }
+        with open(os.path.join(scratch, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+
+        if os.path.exists(os.path.join(self.root, version)):
+            # Same model bytes as an existing version
+            shutil.rmtree(scratch)
+        else:
+            os.replace(scratch, os.path.join(self.root, version))
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        if not os.path.exists(self.path(version, METADATA_FILE)):
+            raise ValueError(f'Unknown model version: {version}')
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        tmp_path = f'{pointer}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(version + '\n')
+        os.replace(tmp_path, pointer)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List or activate registered model versions.')
+    parser.add_argument('command', choices=['list', 'activate'])
+    parser.add_argument('version', nargs='?')
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry()
+    if args.command == 'activate':
+        if not args.version:
+            parser.error('activate needs a version')
+        registry.activate(args.version)
+        print(f'Activated {args.version}')
+        return
+
+    current = registry.current_version()
+    for meta in registry.versions():
+        marker = '*' if meta['version'] == current else ' '
+        metrics = ', '.join(f'{name} {value:.3f}' for name, value in meta['metrics'].items())
+        print(f"{marker} {meta['version']}  {meta['trained_at']}  {meta['model']}  {metrics}")
+    if current is None:
+        print('No active version; serving the files next to app.py', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
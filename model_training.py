@@ -1,269 +1,709 @@
-# Necessary libraries
-import pandas as pd
-import numpy as np
-from sklearn.impute import SimpleImputer
+# Training pipeline for the screening SVC.
+# Importable without side effects; every stage (load, clean, encode, select,
+# search, fit, evaluate, export) caches its output under .cache/training keyed
+# by a hash of its inputs, so re-running with new hyperparameters skips the
+# data preparation and appended screenings only re-clean their own file.
+#   python model_training.py                      # search linear kernels, fit, export
+#   python model_training.py --kernel linear --C 13
+#   python model_training.py --any-kernel          # also search poly/rbf/sigmoid
+#   python model_training.py --append new_screenings.csv
+#   python model_training.py --stream db           # retrain from users.db (see export_data.py)
+#   python model_training.py --publish             # hot-swap into running workers
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
 import warnings
-warnings.filterwarnings('ignore')
-
-# Loading dataset
-ch = pd.read_csv(r"Autism-Child-Data.csv", na_values=['?'])
-adu = pd.read_csv(r"Autism-Adult-Data.csv", na_values=['?'])
-
-# Children
-ch.isnull().sum()
-adu.isnull().sum()
-
-# Imputing missing values of categorical features with mode
-imputer_mode = SimpleImputer(missing_values=np.nan, strategy='most_frequent')
-
-ch.age = imputer_mode.fit_transform(ch.age.values.reshape(-1,1))[:,0]
-ch.ethnicity = imputer_mode.fit_transform(ch.ethnicity.values.reshape(-1,1))[:,0]
-ch.relation = imputer_mode.fit_transform(ch.relation.values.reshape(-1,1))[:,0]
-
-adu.ethnicity = imputer_mode.fit_transform(adu.ethnicity.values.reshape(-1,1))[:,0]
-adu.relation = imputer_mode.fit_transform(adu.relation.values.reshape(-1,1))[:,0]
-
-# Imputing missing values of numerical features with mean
-imputer_mode = SimpleImputer(missing_values=np.nan, strategy='mean')
-
-ch.age = imputer_mode.fit_transform(ch.age.values.reshape(-1,1))[:,0]
-adu.age = imputer_mode.fit_transform(adu.age.values.reshape(-1,1))[:,0]
-
-# Since age of toddlers are represented in months, age(in years) of children, adolescents and adults is converted to age in months.
-ch.rename(columns = {'age':'Age_Mons'}, inplace = True)
-adu.rename(columns = {'age':'Age_Mons'}, inplace = True)
-
-ch['Age_Mons'] = ch['Age_Mons']*12
-adu['Age_Mons'] = adu['Age_Mons']*12
-
-# Making classes of categorical variables same for all datasets
-adu['ethnicity'] = adu['ethnicity'].replace('Others','others')
-
-ch["relation"] = ch["relation"].replace('self','Self')
-
-# Adding a new field that represents the age group
-ch['Age_group'] = 'Children'
-adu['Age_group'] = 'Adults'
-
-# Combining the dataset of children and adults to a single dataset
-frames = [ch,adu]
-final = pd.concat(frames)
-
-# Imputing missing values
-imputer_mode = SimpleImputer(missing_values=np.nan, strategy='most_frequent')
-
-final.contry_of_res = imputer_mode.fit_transform(final.contry_of_res.values.reshape(-1,1))[:,0]
-final.used_app_before = imputer_mode.fit_transform(final.used_app_before.values.reshape(-1,1))[:,0]
-
-final.describe()
-final.shape
+from collections import namedtuple
 
-shuffled_data = final.sample(frac=1,random_state=4)
-ASD_data = shuffled_data.loc[shuffled_data['Class/ASD'] == 'YES']
-non_ASD_data = shuffled_data.loc[shuffled_data['Class/ASD'] == 'NO'].sample(n=666)
-final= pd.concat([ASD_data, non_ASD_data])
-
-# Split the data into features and target label
-raw_target= final['Class/ASD']
-raw_features = final[['A1_Score','A2_Score','A3_Score','A4_Score','A5_Score','A6_Score','A7_Score','A8_Score','A9_Score','A10_Score','Age_Mons', 'gender', 'ethnicity', 'jundice', 'austim', 'contry_of_res', 'result','relation']]
-
-from sklearn.preprocessing import MinMaxScaler
-scaler = MinMaxScaler()
-num_features = ['Age_Mons', 'result']
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.impute import SimpleImputer
 
-features_minmax_transform = pd.DataFrame(data = raw_features)
-features_minmax_transform[num_features] = scaler.fit_transform(raw_features[num_features])
+from linear_scorer import export_scorer, file_digest
+from model_registry import ModelRegistry
+from features import (FeaturePipeline, ANSWER_COLUMNS, NUMERIC_COLUMNS, CATEGORICAL_COLUMNS, CSV_COLUMNS,
+                      PIPELINE_VERSION, TOP_COUNTRIES, TOP_RELATIONS, bucket_country, bucket_relation,
+                      is_child, parse_record)
+from recommendations import answer_mask, recommendation_block, DEFAULT_RECOMMENDATION
+from utils import chunked
 
-features_minmax_transform.head()
+warnings.filterwarnings('ignore')
 
-# Grouping countries and relations into broader categories **only during training**
-features_minmax_transform['contry_of_res'] = features_minmax_transform['contry_of_res'].apply(lambda x: 'Other' if x not in ['United States', 'United Kingdom', 'India'] else x)
-features_minmax_transform['relation'] = features_minmax_transform['relation'].apply(lambda x: 'Other' if x not in ['Parent', 'Self', 'Relative'] else x)
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHILD_DATA = os.path.join(BASE_DIR, 'Autism-Child-Data.csv')
+ADULT_DATA = os.path.join(BASE_DIR, 'Autism-Adult-Data.csv')
+# New labelled screenings are appended here rather than to the bundled CSVs,
+# so the cleaned bundled data stays cached
+APPENDED_DATA = os.path.join(BASE_DIR, 'Autism-Appended-Data.csv')
+CACHE_DIR = os.getenv('TRAINING_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'training'))
+MODEL_OUTPUT = os.path.join(BASE_DIR, 'autism_model.pkl')
+PIPELINE_OUTPUT = os.path.join(BASE_DIR, 'autism_pipeline.pkl')
+LINEAR_OUTPUT = os.path.join(BASE_DIR, 'autism_linear.pkl')
+
+RAW_COLUMNS = ANSWER_COLUMNS + ['Age_Mons', 'gender', 'ethnicity', 'jundice', 'austim',
+                                'contry_of_res', 'result', 'relation']
+NUM_FEATURES = ['Age_Mons', 'result']
+
+K_BEST = 75
+NEGATIVE_SAMPLE = 666
+SEED = 4
+TEST_SIZE = 0.20
+SPLIT_SEED = 42
+
+SEARCH_GRID = {
+    'svc__C': [int(x) for x in np.linspace(start=1, stop=20, num=10)],
+    'svc__kernel': ['linear', 'poly', 'rbf', 'sigmoid'],
+    'svc__degree': [int(x) for x in np.linspace(start=1, stop=10, num=10)],
+}
+# The default: a linear model is served as a LinearScorer, one dot product per
+# prediction (see linear_scorer.py); any other kernel evaluates every support
+# vector per prediction
+LINEAR_GRID = {
+    'svc__C': SEARCH_GRID['svc__C'],
+    'svc__kernel': ['linear'],
+}
+SEARCH_CANDIDATES = 100
+SEARCH_SEED = 100
+
+# Bump whenever clean_source/clean/encode/select/search/fit change what they
+# produce. Part of every cache key, with features.PIPELINE_VERSION and the
+# scikit-learn version, so stale stage outputs are never reused.
+STAGE_SCHEMA = 2
+
+# X holds the selected features; unselected is the full one-hot matrix the
+# search pipeline selects from per fold
+Dataset = namedtuple('Dataset', 'X y unselected feature_names pipeline key')
+TrainingResult = namedtuple('TrainingResult', 'model pipeline params metrics X_test y_test feature_names')
+
+
+def cpu_seconds():
+    # CPU time of this process plus reaped child processes (e.g. joblib workers)
+    if resource is None:
+        return time.process_time()
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+class StageTimer:
+    """Prints wall-clock time and CPU utilisation for each training stage."""
+
+    def __init__(self):
+        self.stages = []
+        self._wall = time.perf_counter()
+        self._cpu = cpu_seconds()
+
+    def lap(self, name):
+        wall_now, cpu_now = time.perf_counter(), cpu_seconds()
+        wall, cpu = wall_now - self._wall, cpu_now - self._cpu
+        self._wall, self._cpu = wall_now, cpu_now
+        cores = os.cpu_count() or 1
+        utilisation = cpu / (wall * cores) if wall else 0.0
+        self.stages.append((name, wall, cpu, utilisation))
+        print(f"[{name}] wall {wall:.2f}s, cpu {cpu:.2f}s, {utilisation:.0%} of {cores} cores")
+
+    def summary(self):
+        total = sum(wall for _, wall, _, _ in self.stages)
+        print(f"Total training time: {total:.2f}s")
+
+
+# ---------------------------------------------------------------------------
+# Stage cache
+
+def cache_key(*parts):
+    parts = (STAGE_SCHEMA, PIPELINE_VERSION, sklearn.__version__) + parts
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def cached(stage, key, compute, use_cache=True):
+    # Returns compute()'s result, loading it from .cache/training when a
+    # previous run already produced it for the same inputs
+    path = os.path.join(CACHE_DIR, f'{stage}-{key}.joblib')
+    if use_cache and os.path.exists(path):
+        print(f"[{stage}] cached ({key})")
+        return joblib.load(path)
+    result = compute()
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        joblib.dump(result, tmp_path)
+        os.replace(tmp_path, path)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Stages
+
+def impute(frame, column, strategy):
+    imputer = SimpleImputer(missing_values=np.nan, strategy=strategy)
+    frame[column] = imputer.fit_transform(frame[column].values.reshape(-1, 1))[:, 0]
+
+
+def load_source(path):
+    return pd.read_csv(path, na_values=['?'])
+
+
+def child_rows(frame):
+    # features.is_child for every row, on the values as read (before imputation)
+    columns = [column for column in ('age_desc', 'age') if column in frame]
+    raw = frame[columns].astype(object).where(frame[columns].notna(), None)
+    return pd.Series([is_child(row) for row in raw.to_dict('records')], index=frame.index, dtype=bool)
+
+
+def clean_source(frame, children=False):
+    # Per-file cleaning: imputation uses each file's own statistics, exactly as
+    # the children and adult datasets were always prepared. Child rows are
+    # recognised per row, as parse_record does, since appended files mix both
+    child = child_rows(frame)
+    frame = frame.copy()
+    if children:
+        # Imputing missing values of categorical features with mode
+        for column in ('age', 'ethnicity', 'relation'):
+            impute(frame, column, 'most_frequent')
+    else:
+        for column in ('ethnicity', 'relation'):
+            impute(frame, column, 'most_frequent')
+        # Imputing missing values of numerical features with mean
+        impute(frame, 'age', 'mean')
+
+    # Since age of toddlers are represented in months, age(in years) of children, adolescents and adults is converted to age in months.
+    frame = frame.rename(columns={'age': 'Age_Mons'})
+    frame['Age_Mons'] = frame['Age_Mons'] * 12
+
+    # Making classes of categorical variables same for all datasets
+    frame['ethnicity'] = frame['ethnicity'].where(child, frame['ethnicity'].replace('Others', 'others'))
+    frame['relation'] = frame['relation'].replace('self', 'Self')
+
+    # Adding a new field that represents the age group
+    frame['Age_group'] = np.where(child, 'Children', 'Adults')
+    return frame
+
+
+def check_record_parity(path, cleaned):
+    # The batch endpoint reads raw CSV rows with features.parse_record; every
+    # value it does not leave for imputation must match clean_source()'s.
+    # Together with the pipeline check in select() this covers raw CSV -> features.
+    with open(path, newline='', encoding='utf-8') as f:
+        records = [parse_record(row) for row in csv.DictReader(f)]
+    if len(records) != len(cleaned):
+        raise ValueError(f'{path}: parse_record read {len(records)} rows, read_csv {len(cleaned)}')
+    for i, (record, row) in enumerate(zip(records, cleaned.to_dict('records'))):
+        expected = {field: row[field] for field in ANSWER_COLUMNS + CATEGORICAL_COLUMNS + ['result']}
+        expected['age'] = row['Age_Mons'] / 12
+        for field, value in expected.items():
+            parsed = record.get(field)
+            if parsed is None:
+                continue
+            if field in CATEGORICAL_COLUMNS and parsed != value or \
+                    field not in CATEGORICAL_COLUMNS and not np.isclose(parsed, value):
+                raise ValueError(f'{path} row {i}: parse_record gives {field}={parsed!r}, '
+                                 f'training uses {value!r}')
+
+
+def clean(sources, use_cache=True):
+    """Load and clean each source file, then combine and balance the classes.
+
+    ``sources`` is a list of ``(path, children)`` pairs. Each file's cleaned
+    frame is cached by its content hash, so appending to one file leaves the
+    others untouched.
+    """
+    frames, digests = [], []
+    for path, children in sources:
+        digest = file_digest(path)
+        digests.append(digest)
+        frames.append(cached('clean', cache_key(digest, children),
+                             lambda: clean_source(load_source(path), children), use_cache))
+        check_record_parity(path, frames[-1])
+
+    # Combining the datasets to a single dataset. Exported production data has
+    # no gender/jaundice/family history, so those are imputed here as well
+    final = pd.concat(frames)
+    for column in ('gender', 'jundice', 'austim', 'contry_of_res', 'used_app_before'):
+        impute(final, column, 'most_frequent')
+
+    shuffled_data = final.sample(frac=1, random_state=SEED)
+    ASD_data = shuffled_data.loc[shuffled_data['Class/ASD'] == 'YES']
+    non_ASD_data = shuffled_data.loc[shuffled_data['Class/ASD'] == 'NO']
+    non_ASD_data = non_ASD_data.sample(n=min(NEGATIVE_SAMPLE, len(non_ASD_data)), random_state=SEED)
+    return pd.concat([ASD_data, non_ASD_data]), cache_key(digests)
+
+
+def encode(final):
+    # Split the data into features and target label
+    from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+
+    features_minmax_transform = final[RAW_COLUMNS].copy()
+    scaler = MinMaxScaler()
+    features_minmax_transform[NUM_FEATURES] = scaler.fit_transform(features_minmax_transform[NUM_FEATURES])
+
+    # Grouping countries and relations into broader categories **only during training**
+    features_minmax_transform['contry_of_res'] = features_minmax_transform['contry_of_res'].apply(
+        lambda x: x if x in TOP_COUNTRIES else 'Other')
+    features_minmax_transform['relation'] = features_minmax_transform['relation'].apply(
+        lambda x: x if x in TOP_RELATIONS else 'Other')
+
+    features = pd.get_dummies(features_minmax_transform)
+    target = LabelEncoder().fit_transform(final['Class/ASD'])
+    return features, target, scaler
+
+
+def select(final, features, target, scaler, k=K_BEST):
+    from sklearn.feature_selection import SelectKBest, chi2
+
+    # The k features with highest chi-squared statistics are selected
+    chi2_features = SelectKBest(chi2, k=min(k, features.shape[1]))
+    X = chi2_features.fit_transform(features, target)
+
+    # Capture the fitted preprocessing so the web app can replay it without pandas
+    pipeline = FeaturePipeline.from_training(features.columns, scaler, chi2_features, final)
+
+    # The NumPy path must reproduce the pandas preprocessing row for row
+    raw_records = final[RAW_COLUMNS].assign(age=final['Age_Mons'] / 12).to_dict('records')
+    if not np.allclose(pipeline.transform_many(raw_records), X):
+        raise ValueError('Feature pipeline diverges from training preprocessing')
+    return X, pipeline
+
+
+def prepare(sources=None, k=K_BEST, use_cache=True):
+    """Run load/clean/encode/select and return a ``Dataset``."""
+    sources = sources if sources is not None else default_sources()
+    final, data_key = clean(sources, use_cache)
+    key = cache_key(data_key, k)
+
+    def compute():
+        features, target, scaler = encode(final)
+        X, pipeline = select(final, features, target, scaler, k)
+        return Dataset(X, target, features.to_numpy(dtype=float), list(features.columns), pipeline.to_dict(), key)
+
+    # The pipeline is cached as plain data, so a cache hit is rebuilt through
+    # FeaturePipeline.__init__ and from_dict's version check
+    dataset = cached('prepare', key, compute, use_cache)
+    return dataset._replace(pipeline=FeaturePipeline.from_dict(dataset.pipeline))
+
+
+def split(X, y):
+    from sklearn.model_selection import train_test_split
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=SPLIT_SEED)
+
+
+def search(dataset, use_cache=True, grid=SEARCH_GRID):
+    """Successive-halving search over ``grid``; returns the best SVC params."""
+
+    def compute():
+        from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+        from sklearn.feature_selection import SelectKBest, chi2
+        from sklearn.model_selection import HalvingRandomSearchCV
+        from sklearn.pipeline import Pipeline
+        from sklearn.svm import SVC
+        from joblib import Memory
+        from joblib.externals.loky import get_reusable_executor
+
+        # The search runs on the unselected features with chi2 selection inside
+        # the pipeline, so selection is fitted per CV fold (no leakage from the
+        # held-out fold). joblib Memory caches each fold's fitted selector on
+        # disk, so every candidate evaluated on the same fold reuses it.
+        # split() uses the same seed, so this is the same row split as fit().
+        X_search, _, y_train, _ = split(dataset.unselected, dataset.y)
+        search_pipeline = Pipeline([
+            ('select', SelectKBest(chi2, k=dataset.pipeline.n_features)),
+            ('svc', SVC())
+        ], memory=Memory(os.path.join(CACHE_DIR, 'svc_search'), verbose=0))
+
+        # Successive halving: all candidates start on a small share of the
+        # training rows and only the best third advance to each larger round,
+        # so slow poor candidates (e.g. high-degree poly kernels) are dropped early.
+        svc_search = HalvingRandomSearchCV(estimator=search_pipeline, param_distributions=grid,
+                                           n_candidates=SEARCH_CANDIDATES, factor=3, cv=5, verbose=0,
+                                           random_state=SEARCH_SEED, n_jobs=-1)
+        svc_search.fit(X_search, y_train)
+        # Shut the worker pool down so its CPU time is counted in this stage
+        get_reusable_executor().shutdown(wait=True)
+        print("CV accuracy = ", svc_search.best_score_)
+        return {name.split('__', 1)[1]: value for name, value in svc_search.best_params_.items()}
+
+    return cached('search', cache_key(dataset.key, grid, SEARCH_CANDIDATES, SEARCH_SEED),
+                  compute, use_cache)
+
+
+def fit(dataset, params, use_cache=True):
+    from sklearn.svm import SVC
+
+    def compute():
+        X_train, _, y_train, _ = split(dataset.X, dataset.y)
+        svc = SVC(**params, probability=True)  # Added probability=True for better SHAP values
+        return svc.fit(X_train, y_train)
+
+    return cached('fit', cache_key(dataset.key, params), compute, use_cache)
+
+
+def report_metrics(tn, fp, fn, tp):
+    # Metrics from confusion-matrix counts, so streamed evaluation can report
+    # them without keeping every prediction
+    report = {
+        'accuracy': (tp + tn) / max(tp + tn + fp + fn, 1),
+        'precision': tp / max(tp + fp, 1),
+        'recall': tp / max(tp + fn, 1),
+        'specificity': tn / max(tn + fp, 1),
+    }
+    report['f1'] = 2 * tp / max(2 * tp + fp + fn, 1)
+    print("Accuracy = ", report['accuracy'])
+    print("Precision = ", report['precision'])
+    print(r"Recall\Sensitivity = ", report['recall'])
+    print("F1 Score = ", report['f1'])
+    return {name: float(value) for name, value in report.items()}
 
-features = pd.get_dummies(features_minmax_transform)
-from sklearn.preprocessing import LabelEncoder
-le = LabelEncoder()
-target = le.fit_transform(raw_target)
 
 def model_report(y_act, y_pred):
     from sklearn import metrics
-    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, cohen_kappa_score, roc_curve, auc, log_loss
-    print("Accuracy = ", accuracy_score(y_act, y_pred))
-    print("Precision = " ,precision_score(y_act, y_pred))
-    print(r"Recall\Sensitivity = " ,recall_score(y_act, y_pred))
-    confusion = metrics.confusion_matrix(y_act, y_pred)
+    confusion = metrics.confusion_matrix(y_act, y_pred, labels=[0, 1])
     #[row, column]
-    TP = confusion[1, 1]
-    TN = confusion[0, 0]
-    FP = confusion[0, 1]
-    FN = confusion[1, 0]
-    specificity = TN / (TN + FP)
-    #print("Specificity = " ,specificity)
-    print("F1 Score = " ,f1_score(y_act, y_pred))
-    false_positive_rate, true_positive_rate, thresholds = roc_curve(y_act, y_pred)
-    pass
-
-X = features
-y = target
-print("Model expects these features:")
-print(X.columns)
-
-from sklearn.feature_selection import SelectKBest 
-from sklearn.feature_selection import chi2  
-chi2_features = SelectKBest(chi2,k=75)
-fit= chi2_features.fit(X, y)
-scores = pd.DataFrame(fit.scores_)
-columns = pd.DataFrame(features.columns)
-featureScores = pd.concat([columns,scores],axis=1)
-featureScores.columns = ['Features','Score']
-#print(featureScores.nlargest(50,'Score')) 
-
-from sklearn.feature_selection import SelectKBest 
-from sklearn.feature_selection import chi2  
-# 700 features with highest chi-squared statistics are selected 
-chi2_features = SelectKBest(chi2,k=75)
-X = chi2_features.fit_transform(X, y)
-y = target
-
-# Splitting the data into train test split
-from sklearn.model_selection import train_test_split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size = 0.20, random_state = 42)
-from sklearn.model_selection import RandomizedSearchCV
-
-C = [int(x) for x in np.linspace(start = 1, stop = 20, num = 10)]
-kernel = ['linear', 'poly', 'rbf', 'sigmoid']
-degree = [int(x) for x in np.linspace(start = 1, stop = 10, num = 10)]
-
-random_grid = {'C':C,
-               'kernel':kernel,
-               'degree':degree}
-#print(random_grid)
-
-from sklearn.svm import SVC
-svc = SVC()
-svc_randomcv=RandomizedSearchCV(estimator= svc, param_distributions=random_grid, n_iter=100, cv=5, verbose=0,
-                               random_state=100,n_jobs=-1)
-# Fit the randomized model
-svc_randomcv.fit(X_train,y_train)
-
-# Use the best hyperparameters found or the specified ones
-svc = SVC(kernel='linear', degree=3, C=13, probability=True)  # Added probability=True for better SHAP values
-svc.fit(X_train, y_train)
-
-y_pred_svc = svc.predict(X_test)
-model_report(y_test, y_pred_svc)
-
+    return report_metrics(confusion[0, 0], confusion[0, 1], confusion[1, 0], confusion[1, 1])
+
+
+def evaluate(model, dataset):
+    _, X_test, _, y_test = split(dataset.X, dataset.y)
+    return model_report(y_test, model.predict(X_test)), X_test, y_test
+
+
+def export(model, pipeline, X_test, model_path=MODEL_OUTPUT, pipeline_path=PIPELINE_OUTPUT,
+           linear_path=LINEAR_OUTPUT):
+    # Save the trained model as a .pkl file
+    joblib.dump(model, model_path)
+    pipeline.save(pipeline_path)
+    # Linear models are also exported as a weight vector for serving, after a
+    # parity check against predict_proba on the held-out split
+    export_scorer(model, model_path, linear_path, X_test)
+    print("Model saved successfully!")
+
+
+def default_sources():
+    sources = [(CHILD_DATA, True), (ADULT_DATA, False)]
+    if os.path.exists(APPENDED_DATA):
+        sources.append((APPENDED_DATA, False))
+    return sources
+
+
+def train(params=None, sources=None, k=K_BEST, export_to=(MODEL_OUTPUT, PIPELINE_OUTPUT), use_cache=True,
+          publish=False, any_kernel=False):
+    """Run every stage and return a ``TrainingResult``.
+
+    ``params`` are SVC hyperparameters; when omitted they come from search()
+    over LINEAR_GRID, or SEARCH_GRID with ``any_kernel=True``. A non-linear
+    model cannot be served by the linear scorer, so exporting or publishing
+    one needs ``any_kernel=True``.
+    Pass ``export_to=None`` to train without overwriting the served model, and
+    ``publish=True`` to add it to the model registry as the active version.
+    """
+    kernel = params.get('kernel', 'rbf') if params is not None else 'linear'  # SVC defaults to rbf
+    if kernel != 'linear' and (export_to or publish) and not any_kernel:
+        raise ValueError(f'A {kernel} kernel would be served without the linear scorer; '
+                         f'pass any_kernel=True to export or publish it anyway')
+    timer = StageTimer()
+    dataset = prepare(sources, k, use_cache)
+    print("Model expects these features:")
+    print(dataset.pipeline.selected_columns)
+    timer.lap('load, clean, encode & select')
+
+    if params is None:
+        params = search(dataset, use_cache, SEARCH_GRID if any_kernel else LINEAR_GRID)
+        timer.lap('hyperparameter search')
+    print("Hyperparameters:", params)
+
+    model = fit(dataset, params, use_cache)
+    timer.lap('fit')
+
+    metrics, X_test, y_test = evaluate(model, dataset)
+    timer.lap('evaluate')
+
+    if export_to:
+        export(model, dataset.pipeline, X_test, *export_to)
+        timer.lap('export')
+    if publish:
+        print("Published model version", ModelRegistry().publish(model, dataset.pipeline, metrics, params, X_test))
+        timer.lap('publish')
+    timer.summary()
+    # Named like X_test's columns, i.e. after selection
+    return TrainingResult(model, dataset.pipeline, params, metrics, X_test, y_test,
+                          dataset.pipeline.selected_columns)
+
+
+# ---------------------------------------------------------------------------
+# Streaming mode: for training sets too large for one DataFrame (e.g. the
+# database export). The data is read in chunks over several passes, and only
+# running statistics are held in memory between chunks.
+
+STREAM_CHUNK_SIZE = 5000
+STREAM_EPOCHS = 5
+# Every fifth record (by stream position) is held out for evaluation
+STREAM_HOLDOUT = 5
+STREAM_PARITY_ROWS = 1000
+
+
+def iter_csv_screenings(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield parse_record(row)
+
+
+def normalize_screening(record):
+    # Per-record part of clean_source(); imputation is left to the pipeline
+    if record.get('ethnicity') == 'Others':
+        record = dict(record, ethnicity='others')
+    return record
+
+
+def iter_stream_chunks(open_stream, chunk_size):
+    # Yields (chunk, labels, holdout mask) for one pass over the stream
+    position = 0
+    for chunk in chunked(open_stream(), chunk_size):
+        chunk = [normalize_screening(record) for record in chunk]
+        labels = np.array([record.get('Class/ASD') == 'YES' for record in chunk], dtype=int)
+        holdout = (np.arange(position, position + len(chunk)) % STREAM_HOLDOUT) == 0
+        position += len(chunk)
+        yield chunk, labels, holdout
+
+
+def stream_pipeline(open_stream, chunk_size, k):
+    """Fit a FeaturePipeline from running statistics instead of a DataFrame.
+
+    Pass 1 collects category counts, the Age_Mons mean and the min/max of the
+    scaled columns. Pass 2 accumulates the per-class feature sums chi2 needs.
+    """
+    counts = {field: {} for field in CATEGORICAL_COLUMNS}
+    age_sum = age_count = 0
+    low = np.full(len(NUMERIC_COLUMNS), np.inf)
+    high = np.full(len(NUMERIC_COLUMNS), -np.inf)
+    for chunk, _, _ in iter_stream_chunks(open_stream, chunk_size):
+        for record in chunk:
+            for field in CATEGORICAL_COLUMNS:
+                value = record.get(field)
+                if value is not None:
+                    counts[field][value] = counts[field].get(value, 0) + 1
+            if record.get('age') is not None:
+                age_sum += record['age'] * 12
+                age_count += 1
+        numeric = np.array([
+            [np.nan if record.get('age') is None else record['age'] * 12,
+             record['result'] if record.get('result') is not None
+             else sum(int(record.get(c) or 0) for c in ANSWER_COLUMNS)]
+            for record in chunk
+        ])
+        low = np.fmin(low, np.nanmin(numeric, axis=0))
+        high = np.fmax(high, np.nanmax(numeric, axis=0))
+
+    if not age_count:
+        raise ValueError('The training stream is empty')
+    # A field never present in the stream (e.g. ethnicity in the database export)
+    # has no mode and no dummy columns; its missing values encode as all zeros
+    fill_values = {field: max(values, key=values.get) if values else None for field, values in counts.items()}
+    fill_values['Age_Mons'] = age_sum / age_count
+    # Imputed ages are the mean, which always lies inside the observed range
+    buckets = {'contry_of_res': bucket_country, 'relation': bucket_relation}
+    columns = list(ANSWER_COLUMNS) + list(NUMERIC_COLUMNS)
+    for field in CATEGORICAL_COLUMNS:
+        bucket = buckets.get(field, lambda value: value)
+        columns += [f'{field}_{value}' for value in sorted({bucket(value) for value in counts[field]})]
+    pipeline = FeaturePipeline(columns, low, high, fill_values, np.ones(len(columns), dtype=bool))
+
+    # chi2 as computed by sklearn.feature_selection.chi2, from running sums
+    observed = np.zeros((2, len(columns)))
+    class_count = np.zeros(2)
+    for chunk, labels, _ in iter_stream_chunks(open_stream, chunk_size):
+        X = pipeline.transform_many(chunk)
+        for label in (0, 1):
+            observed[label] += X[labels == label].sum(axis=0)
+            class_count[label] += (labels == label).sum()
+    expected = np.outer(class_count / class_count.sum(), observed.sum(axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.nan_to_num(((observed - expected) ** 2 / expected).sum(axis=0))
+    support = np.zeros(len(columns), dtype=bool)
+    support[np.argsort(-scores, kind='stable')[:k]] = True
+    return FeaturePipeline(columns, low, high, fill_values, support), class_count
+
+
+def train_streaming(open_stream, chunk_size=STREAM_CHUNK_SIZE, k=K_BEST, epochs=STREAM_EPOCHS,
+                    export_to=(MODEL_OUTPUT, PIPELINE_OUTPUT), publish=False):
+    """Train from a stream of records without materialising it.
+
+    ``open_stream`` is called once per pass and must return a fresh iterable of
+    records in the Autism-Adult-Data.csv layout (see iter_csv_screenings and
+    export_data.iter_screenings). A kernel SVC needs the whole training set in
+    memory, so this mode fits a logistic-loss linear model with SGD one chunk at
+    a time; it exposes predict_proba like the SVC and is served the same way.
+    """
+    from sklearn.linear_model import SGDClassifier
+
+    timer = StageTimer()
+    pipeline, class_count = stream_pipeline(open_stream, chunk_size, k)
+    print(f"Streamed {int(class_count.sum())} screenings, {pipeline.n_features} features selected")
+    timer.lap('stream statistics & select')
+
+    # Balanced class weights, as the negative sampling does in train()
+    weights = class_count.sum() / (2 * np.maximum(class_count, 1))
+    model = SGDClassifier(loss='log_loss', alpha=1e-4, class_weight={0: weights[0], 1: weights[1]},
+                          random_state=SEED)
+    params = model.get_params()
+    for _ in range(epochs):
+        for chunk, labels, holdout in iter_stream_chunks(open_stream, chunk_size):
+            if (~holdout).any():
+                model.partial_fit(pipeline.transform_many(chunk)[~holdout], labels[~holdout], classes=[0, 1])
+    timer.lap('fit')
+
+    confusion = np.zeros((2, 2), dtype=int)
+    # A bounded sample of held-out rows for the linear scorer's parity check
+    X_check = np.empty((0, pipeline.n_features))
+    for chunk, labels, holdout in iter_stream_chunks(open_stream, chunk_size):
+        if holdout.any():
+            X = pipeline.transform_many(chunk)[holdout]
+            np.add.at(confusion, (labels[holdout], model.predict(X)), 1)
+            if len(X_check) < STREAM_PARITY_ROWS:
+                X_check = np.vstack([X_check, X[:STREAM_PARITY_ROWS - len(X_check)]])
+    metrics = report_metrics(confusion[0, 0], confusion[0, 1], confusion[1, 0], confusion[1, 1])
+    timer.lap('evaluate')
+
+    if export_to:
+        export(model, pipeline, X_check, *export_to)
+        timer.lap('export')
+    if publish:
+        print("Published model version", ModelRegistry().publish(model, pipeline, metrics, params, X_check))
+        timer.lap('publish')
+    timer.summary()
+    # The held-out rows are never collected, so there is no X_test to return;
+    # the names match the model's inputs, as in train()
+    return TrainingResult(model, pipeline, params, metrics, None, None, pipeline.selected_columns)
+
+
+def append_records(records, path=APPENDED_DATA):
+    """Append labelled screenings (dicts in the Autism-Adult-Data.csv layout).
+
+    Only this file is re-cleaned on the next train(); the bundled datasets stay
+    cached. Fields missing from a record are written as '?' and imputed.
+    """
+    new_file = not os.path.exists(path)
+    count = 0
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, restval='?', extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        for record in records:
+            writer.writerow({key: '?' if value is None else value for key, value in record.items()})
+            count += 1
+    return count
+
+
+# ---------------------------------------------------------------------------
 # Recommendation Part
-def generate_personalized_report(name, instance_index, raw_answers=None):
-    # Get feature values (answers) for this instance
-    instance = X_test.iloc[instance_index] if hasattr(X_test, 'iloc') else X_test[instance_index]
-    
-    # Define a mapping for question descriptions (replace with actual descriptions)
-    question_descriptions = {
-        'A1': 'noticing small sounds when others do not',
-        'A2': 'usually concentrating more on the whole picture rather than small details',
-        'A3': 'finding it easy to do more than one thing at once',
-        'A4': 'if there is an interruption, can switch back to what you were doing quickly',
-        'A5': 'finding it easy to "read between the lines" when someone is talking to you',
-        'A6': 'knowing how to tell if someone listening to you is getting bored',
-        'A7': 'finding it difficult to work out people\'s intentions',
-        'A8': 'finding it difficult to make new friends',
-        'A9': 'enjoying social occasions',
-        'A10': 'finding it hard to work out what other people are thinking or feeling'
-    }
-
-    # Define recommendations based on AQ questions
-    recommendation_map = {
-        'A1': {
-            1: "Consider sensory training exercises to help manage auditory sensitivity. This might include gradual exposure to different environments with varying noise levels.",
-            0: "Your normal auditory processing is a strength. Continue to maintain balanced sensory environments."
-        },
-        'A2': {
-            1: "Practice focusing on details through activities like puzzles or detailed artwork to balance your tendency to see the whole picture.",
-            0: "Work on seeing the bigger picture through activities that require holistic thinking like strategic games or system mapping."
-        },
-        'A3': {
-            1: "Your ability to multitask is a strength. Continue to utilize this in your daily activities.",
-            0: "Practice single-tasking with full attention, then gradually introduce secondary tasks to improve multitasking abilities."
-        },
-        'A4': {
-            1: "Your ability to resume tasks after interruption is a strength. Continue to apply this skill in structured environments.",
-            0: "Practice task-switching exercises and use techniques like pomodoro method to build task resumption skills."
-        },
-        'A5': {
-            1: "Continue to leverage your ability to understand implied meanings in communication.",
-            0: "Consider practicing contextual interpretation through reading literary texts with metaphors and discussing them with others."
-        },
-        'A6': {
-            1: "Your social attentiveness is a strength. Continue to observe and respond to social cues.",
-            0: "Practice recognizing boredom signals through social skills training or by watching and analyzing social interactions in media."
-        },
-        'A7': {
-            1: "Work with a therapist on theory of mind exercises to better understand others' intentions.",
-            0: "Your ability to understand others' intentions is a strength. Continue to use this in social situations."
-        },
-        'A8': {
-            1: "Consider structured social activities based on your interests to practice friendship-building skills.",
-            0: "Your social connection skills are a strength. Continue to use these skills to build and maintain relationships."
-        },
-        'A9': {
-            1: "Your enjoyment of social occasions is a strength. Continue to engage in social activities that you find pleasant.",
-            0: "Start with small, structured social interactions in environments where you feel comfortable, gradually expanding your comfort zone."
-        },
-        'A10': {
-            1: "Consider emotion recognition training or working with a therapist on empathy-building exercises.",
-            0: "Your emotional intelligence is a strength. Continue to apply this in your interpersonal relationships."
-        }
-    }
 
-    # Generate personalized report statements
-    print(f"\n--- Personalized Analysis Report for {name} ---\n")
-    
-    # Get answers from raw_answers if provided, otherwise use instance values
+def answers_from_instance(instance, feature_names):
+    # Recover the A1..A10 answers from a (selected) feature row
     answers = {}
-    if raw_answers is not None:
-        answers = raw_answers
-    else:
-        for idx, row in enumerate(instance):
-            feature = features.columns[idx]
-            if feature.startswith('A') and feature.endswith('_Score'):
-                question = feature.split('_')[0]
-                answers[question] = int(row)
-    
-    # Generate statements for each question sequentially from A1 to A10
-    for question in sorted(answers.keys()):
-        answer = answers[question]
-        description = question_descriptions.get(question, 'unknown question')
-        recommendation = recommendation_map.get(question, {}).get(answer, 'Consider consulting with a specialist for personalized guidance.')
-        
-        statement = (
-            f"{name}, your response to question {question} "
-            f"({description}) was {answer}. "
-            f"\nRecommendation: {recommendation}."
+    for idx, value in enumerate(instance):
+        feature = feature_names[idx]
+        if feature.startswith('A') and feature.endswith('_Score'):
+            answers[feature.split('_')[0]] = int(value)
+    return answers
+
+
+def personalized_report(name, answers):
+    # Generate statements for each question sequentially from A1 to A10,
+    # using the same precomputed recommendation block as the web results page
+    lines = [f"\n--- Personalized Analysis Report for {name} ---\n"]
+    mask = answer_mask([answers.get(f'A{i}', 0) for i in range(1, 11)])
+    for rec in recommendation_block(mask):
+        if rec.code not in answers:
+            continue
+        answer = answers[rec.code]
+        recommendation = rec.recommendation if answer in (0, 1) else DEFAULT_RECOMMENDATION
+
+        lines.append(
+            f"{name}, your response to question {rec.code} "
+            f"({rec.description}) was {answer}. "
+            f"\nRecommendation: {recommendation}.\n"
         )
-        
-        print(statement)
-        print()
-    
-    # Add summary and disclaimer with improved wording
-    print("\n--- Summary ---")
-    print("This analysis is based on your responses to the Autism Spectrum Quotient (AQ) questions.")
-    print("Disclaimer: This analysis is for informational purposes only and not a clinical diagnosis.")
-    print("Please consult with a qualified healthcare professional for proper evaluation and guidance.")
 
-# Example usage
-if __name__ == "__main__":
-    # Example of using the function
-    generate_personalized_report(
-        name="John", 
-        instance_index=0,
-        # Optionally provide raw answers if not directly available from X_test
-        # raw_answers={'A1': 1, 'A2': 0, 'A3': 0, 'A4': 1, 'A5': 0, 'A6': 0, 'A7': 1, 'A8': 1, 'A9': 0, 'A10': 1}
-    )
-
-import joblib
+    # Add summary and disclaimer with improved wording
+    lines += [
+        "\n--- Summary ---",
+        "This analysis is based on your responses to the Autism Spectrum Quotient (AQ) questions.",
+        "Disclaimer: This analysis is for informational purposes only and not a clinical diagnosis.",
+        "Please consult with a qualified healthcare professional for proper evaluation and guidance.",
+    ]
+    return '\n'.join(lines)
+
+
+def generate_personalized_report(name, instance=None, feature_names=None, raw_answers=None):
+    # Prints the report for raw answers ({'A1': 1, ...}) or a feature row from X_test
+    answers = raw_answers if raw_answers is not None else answers_from_instance(instance, feature_names)
+    print(personalized_report(name, answers))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the screening SVC and export it for the web app.')
+    parser.add_argument('--kernel', help='skip the search and train with this kernel')
+    parser.add_argument('--C', type=float, default=1.0)
+    parser.add_argument('--degree', type=int, default=3)
+    parser.add_argument('--any-kernel', action='store_true',
+                        help='allow non-linear kernels, which are served without the fast linear scorer')
+    parser.add_argument('--append', metavar='CSV', help='append labelled screenings to the training data first')
+    parser.add_argument('--no-export', action='store_true', help='do not overwrite autism_model.pkl')
+    parser.add_argument('--no-cache', action='store_true', help='recompute every stage')
+    parser.add_argument('--publish', action='store_true',
+                        help='add the model to the registry and activate it; running workers swap to it')
+    parser.add_argument('--stream', metavar='SOURCE',
+                        help="train in streaming mode from a CSV file, or 'db' for the app database")
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument('--include-model-labels', action='store_true',
+                        help="with --stream db, also train on attempts labelled by a model's own prediction")
+    args = parser.parse_args(argv)
+    export_to = None if args.no_export else (MODEL_OUTPUT, PIPELINE_OUTPUT)
+    if args.kernel not in (None, 'linear') and (export_to or args.publish) and not args.any_kernel:
+        parser.error(f'a {args.kernel} kernel is served without the linear scorer; pass --any-kernel '
+                     f'to export or publish it anyway')
+
+    if args.stream == 'db':
+        from app import app
+        from export_data import iter_screenings
+
+        with app.app_context():
+            probe = iter_screenings(1, args.include_model_labels)
+            empty = next(probe, None) is None
+            probe.close()
+            if empty:
+                parser.error('no stored attempts have a label that did not come from a model; '
+                             'pass --include-model-labels to train on model predictions anyway')
+            train_streaming(lambda: iter_screenings(args.chunk_size, args.include_model_labels),
+                            args.chunk_size, export_to=export_to, publish=args.publish)
+        return
+    if args.stream:
+        train_streaming(lambda: iter_csv_screenings(args.stream), args.chunk_size, export_to=export_to,
+                        publish=args.publish)
+        return
+
+    if args.append:
+        with open(args.append, newline='', encoding='utf-8') as f:
+            print(f"Appended {append_records(csv.DictReader(f))} screenings to {APPENDED_DATA}")
+
+    params = None
+    if args.kernel:
+        params = {'kernel': args.kernel, 'C': args.C, 'degree': args.degree}
+    result = train(params, export_to=export_to, use_cache=not args.no_cache, publish=args.publish,
+                   any_kernel=args.any_kernel)
+
+    # Example of using the report for the first held-out screening
+    generate_personalized_report(name="John", instance=result.X_test[0], feature_names=result.feature_names)
 
-# Save the trained model as a .pkl file
-joblib.dump(svc, 'autism_model.pkl')
 
-print("Model saved successfully!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import UserMixin
+from datetime import datetime
+
+db = SQLAlchemy()
+
+
+# User model for database
+class User(UserMixin, db.Model):
+    __tablename__ = 'user'  # Explicit table name
+    id = db.Column(db.Integer, primary_key=True)
+    full_name = db.Column(db.String(100), nullable=False)
+    age = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(30), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+class TestAttempt(db.Model):
+    # Serves "attempts of a user, newest first" for history and latest results
+    __table_args__ = (
+        db.Index('ix_test_attempt_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    score = db.Column(db.Integer)
+    result = db.Column(db.String(20))  # 'Positive' or 'Negative'
+    model_version = db.Column(db.String(40))  # model that scored it (see model_registry.py)
+    # Demographics form answers the model was given; NULL when it was skipped
+    gender = db.Column(db.String(10))
+    jaundice = db.Column(db.Boolean)
+    autism_family = db.Column(db.Boolean)
+    relation = db.Column(db.String(20))
+    
+    # Relationship
+    user = db.relationship('User', backref='test_attempts')
+
+class TestAnswer(db.Model):
+    __table_args__ = (
+        db.Index('ix_test_answer_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    attempt_id = db.Column(db.Integer, db.ForeignKey('test_attempt.id'), index=True)
+    question_id = db.Column(db.Integer)
+    answer = db.Column(db.Integer)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User', backref='test_answers')
+    attempt = db.relationship('TestAttempt', backref='answers')
+
+
+# Rollups maintained by rollups.record_attempt() in the same transaction as
+# every attempt insert, so dashboards never aggregate TestAttempt/TestAnswer.
+class UserStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    test_count = db.Column(db.Integer, nullable=False, default=0)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+    last_score = db.Column(db.Integer)
+    last_attempt_at = db.Column(db.DateTime)
+
+class UserDailyStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    test_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyStats(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    test_count = db.Column(db.Integer, nullable=False, default=0)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Integer, nullable=False, default=0)
+
+class AgeGroupStats(db.Model):
+    age_group = db.Column(db.String(20), primary_key=True)
+    test_count = db.Column(db.Integer, nullable=False, default=0)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)
+
+class QuestionStats(db.Model):
+    question_id = db.Column(db.Integer, primary_key=True)
+    answer_count = db.Column(db.Integer, nullable=False, default=0)
+    agree_count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,123 @@
+# Probabilities cached by encoded feature vector. Ten binary answers and a few
+# bucketed demographics give a small input space, so identical vectors recur
+# across users. Entries are keyed by the model version too (a digest of the
+# model file), so a retrained model never sees the previous model's results.
+#
+# An in-process LRU answers most lookups; with PREDICTION_CACHE_DB set, misses
+# fall through to a SQLite table shared by every worker on the host.
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_DB = os.getenv('PREDICTION_CACHE_DB')
+
+
+class SharedPredictionTable:
+    """SQLite table of (version, vector) -> probability usable across processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._versions = set()
+
+    def _connection(self):
+        # sqlite3 connections cannot cross threads or a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS prediction ('
+                ' version TEXT NOT NULL, vector BLOB NOT NULL, probability REAL NOT NULL,'
+                ' PRIMARY KEY (version, vector)) WITHOUT ROWID'
+            )
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _use_version(self, connection, version):
+        # The first time a process scores with a model version, rows left by
+        # older models are dropped
+        if version not in self._versions:
+            connection.execute('DELETE FROM prediction WHERE version != ?', (version,))
+            self._versions.add(version)
+
+    def get(self, version, key):
+        connection = self._connection()
+        self._use_version(connection, version)
+        row = connection.execute('SELECT probability FROM prediction WHERE version = ? AND vector = ?',
+                                 (version, key)).fetchone()
+        return None if row is None else row[0]
+
+    def put_many(self, version, items):
+        connection = self._connection()
+        connection.executemany('INSERT OR IGNORE INTO prediction VALUES (?, ?, ?)',
+                               [(version, key, probability) for key, probability in items])
+
+
+class PredictionCache:
+    """Bounded LRU of probabilities keyed by model version and feature vector."""
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, shared_path=PREDICTION_CACHE_DB):
+        self.maxsize = maxsize
+        self.shared = SharedPredictionTable(shared_path) if shared_path and maxsize > 0 else None
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, version, vector):
+        # vector is one encoded row; returns None on a miss
+        key = (version, vector.tobytes())
+        with self._lock:
+            probability = self._entries.get(key)
+            if probability is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return probability
+        if self.shared is not None:
+            probability = self.shared.get(version, key[1])
+            if probability is not None:
+                self._store(key, probability)
+                with self._lock:
+                    self.shared_hits += 1
+                return probability
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put_many(self, version, vectors, probabilities):
+        items = [(vector.tobytes(), float(p)) for vector, p in zip(vectors, probabilities)]
+        for key, probability in items:
+            self._store((version, key), probability)
+        if self.shared is not None:
+            self.shared.put_many(version, items)
+
+    def _store(self, key, probability):
+        with self._lock:
+            self._entries[key] = probability
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,344 @@
+# Model serving layer: the SVC trained by model_training.py is loaded once per
+# process and kept resident, so requests never pay the joblib/sklearn import cost.
+import gc
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import joblib
+import numpy as np
+
+from features import FeaturePipeline, GENDER_CODES, RELATION_CODES
+from linear_scorer import LinearScorer, file_digest
+from model_registry import ModelRegistry, MODEL_FILE, PIPELINE_FILE, LINEAR_FILE
+from prediction_cache import PredictionCache
+from utils import PerProcess
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.getenv('MODEL_PATH', os.path.join(BASE_DIR, 'autism_model.pkl'))
+PIPELINE_PATH = os.getenv('PIPELINE_PATH', os.path.join(BASE_DIR, 'autism_pipeline.pkl'))
+# Exported by model_training.py when the model is linear; served in its place
+LINEAR_MODEL_PATH = os.getenv('LINEAR_MODEL_PATH', os.path.join(BASE_DIR, 'autism_linear.pkl'))
+
+# Micro-batching of concurrent single predictions (a wait of 0 disables it)
+PREDICT_MAX_BATCH = int(os.getenv('PREDICT_MAX_BATCH', 32))
+PREDICT_MAX_WAIT_MS = float(os.getenv('PREDICT_MAX_WAIT_MS', 2))
+
+# How often workers check the model registry for a newly activated version
+# (0 disables hot-swapping)
+MODEL_POLL_SECONDS = float(os.getenv('MODEL_POLL_SECONDS', 5))
+
+def record_from_form(answers, age, demographics=None):
+    # Translate the web flow's answers and demographics into a record in the
+    # Autism-Adult-Data.csv layout; fields the form does not ask for are left
+    # out and imputed by the pipeline the same way training imputes them.
+    demographics = demographics or {}
+    record = {f'A{i}_Score': int(answers[i - 1]) for i in range(1, 11)}
+    record['age'] = age
+    record['gender'] = GENDER_CODES.get(demographics.get('gender'))
+    record['jundice'] = 'yes' if demographics.get('jaundice') else 'no'
+    record['austim'] = 'yes' if demographics.get('autism_family') else 'no'
+    record['relation'] = RELATION_CODES.get(demographics.get('relation'), 'Other')
+    return record
+
+
+def model_version(path=MODEL_PATH):
+    return file_digest(path)[:12]
+
+
+def load_model(path=MODEL_PATH, linear_path=LINEAR_MODEL_PATH):
+    # The linear scorer is only used if it was exported from this exact model
+    # file; after a retrain without one, the pickled model is served as is
+    if linear_path and os.path.exists(linear_path):
+        scorer = LinearScorer.load(linear_path)
+        if scorer.source == file_digest(path):
+            return scorer
+    return joblib.load(path)
+
+
+class Predictor:
+    """Resident wrapper around the fitted SVC with inference latency tracking.
+
+    ``version`` identifies the model (a digest of its file) and namespaces the
+    optional prediction ``cache``.
+    """
+
+    def __init__(self, model, pipeline, window=10000, version=None, cache=None):
+        self.model = model
+        self.pipeline = pipeline
+        self.version = version
+        self.cache = cache if cache is not None and cache.enabled and version else None
+        self.positive_index = list(model.classes_).index(1)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+        if model.n_features_in_ != pipeline.n_features:
+            raise ValueError(
+                f'Model expects {model.n_features_in_} features, '
+                f'pipeline produces {pipeline.n_features}; retrain with model_training.py'
+            )
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, pipeline_path=PIPELINE_PATH, linear_path=LINEAR_MODEL_PATH, cache=None):
+        return cls(load_model(path, linear_path), FeaturePipeline.load(pipeline_path),
+                   version=model_version(path), cache=cache)
+
+    @classmethod
+    def load_registered(cls, registry, version, cache=None):
+        return cls.load(registry.path(version, MODEL_FILE), registry.path(version, PIPELINE_FILE),
+                        registry.path(version, LINEAR_FILE), cache=cache)
+
+    @classmethod
+    def load_active(cls, registry, cache=None):
+        # The registry's active version, or the files next to app.py before
+        # anything has been published
+        version = registry.current_version()
+        if version is None:
+            return cls.load(cache=cache)
+        return cls.load_registered(registry, version, cache=cache)
+
+    def validate(self, metadata):
+        # Checks run on a freshly loaded version before it may serve requests
+        features = [self.pipeline.columns[i] for i in self.pipeline.selected]
+        if features != metadata['features']:
+            raise ValueError('Pipeline features differ from the published feature list')
+        if self.version != metadata['version']:
+            raise ValueError(f"Model file digest {self.version} does not match version {metadata['version']}")
+        probability = self.predict_proba(self.pipeline.transform(record_from_form([0] * 10, 30)))[0]
+        if not 0.0 <= probability <= 1.0:
+            raise ValueError(f'Canary prediction out of range: {probability}')
+
+    def predict_proba(self, X):
+        start = time.perf_counter()
+        proba = self.model.predict_proba(X)[:, self.positive_index]
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latencies.append(elapsed)
+        return proba
+
+    def lookup(self, row):
+        # Cached probability for one encoded row, or None
+        return None if self.cache is None else self.cache.get(self.version, row)
+
+    def compute(self, X):
+        # predict_proba for rows known to be uncached; the results are cached
+        proba = self.predict_proba(X)
+        if self.cache is not None:
+            self.cache.put_many(self.version, X, proba)
+        return proba
+
+    def score(self, X):
+        # Probabilities for encoded rows, from the cache where possible; the
+        # misses are scored together with one predict_proba call
+        if self.cache is None:
+            return self.predict_proba(X)
+        proba = np.empty(len(X))
+        missing = []
+        for i, row in enumerate(X):
+            cached = self.lookup(row)
+            if cached is None:
+                missing.append(i)
+            else:
+                proba[i] = cached
+        if missing:
+            proba[missing] = self.compute(X[missing])
+        return proba
+
+    def predict(self, answers, age, demographics=None):
+        # Returns the probability of the positive (ASD) class for one screening
+        record = record_from_form(answers, age, demographics)
+        return float(self.score(self.pipeline.transform(record))[0])
+
+    def predict_records(self, records):
+        # Vectorize a whole batch and score it with a single predict_proba call
+        return self.score(self.pipeline.transform_many(records))
+
+    def latency_percentiles(self):
+        with self._lock:
+            samples = np.array(self._latencies)
+        if not len(samples):
+            return {'count': 0, 'p50_ms': None, 'p99_ms': None}
+        p50, p99 = np.percentile(samples, [50, 99]) * 1000
+        return {'count': len(samples), 'p50_ms': round(p50, 3), 'p99_ms': round(p99, 3)}
+
+
+class MicroBatcher:
+    """Coalesces concurrent single predictions into one predict_proba call.
+
+    The first queued request opens a window of ``max_wait_ms``; everything that
+    arrives before it closes (up to ``max_batch``) is scored together. Cache
+    hits are answered on the calling thread without queueing.
+    """
+
+    def __init__(self, predictor, max_batch=PREDICT_MAX_BATCH, max_wait_ms=PREDICT_MAX_WAIT_MS):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = 0
+        self.batches = 0
+        # Each gunicorn worker starts its own batching thread
+        self._queue = PerProcess(self._start)
+
+    @property
+    def enabled(self):
+        return self.max_batch > 1 and self.max_wait > 0
+
+    def predict(self, answers, age, demographics=None):
+        return self.predict_with_version(answers, age, demographics)[0]
+
+    def predict_with_version(self, answers, age, demographics=None):
+        # Returns (probability, version of the model that produced it). The
+        # predictor is read once, so a concurrent hot-swap cannot mix versions
+        predictor = self.predictor
+        if not self.enabled:
+            return predictor.predict(answers, age, demographics), predictor.version
+        row = predictor.pipeline.transform(record_from_form(answers, age, demographics))
+        cached = predictor.lookup(row[0])
+        if cached is not None:
+            return cached, predictor.version
+        future = Future()
+        self._queue.get().put((predictor, row, future))
+        return future.result(), predictor.version
+
+    def _start(self):
+        pending = queue.Queue()
+        threading.Thread(target=self._run, args=(pending,), daemon=True).start()
+        return pending
+
+    def _run(self, pending):
+        while True:
+            items = [pending.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Rows are scored by the predictor that encoded them; a batch only
+            # spans two predictors while a new model version is swapped in
+            groups = {}
+            for predictor, row, future in items:
+                groups.setdefault(predictor, []).append((row, future))
+            for predictor, group in groups.items():
+                try:
+                    proba = predictor.compute(np.vstack([row for row, _ in group]))
+                except Exception as e:
+                    for _, future in group:
+                        future.set_exception(e)
+                    continue
+                for (_, future), p in zip(group, proba):
+                    future.set_result(float(p))
+                self.batches += 1
+            self.requests += len(items)
+
+    def stats(self):
+        mean = self.requests / self.batches if self.batches else None
+        return {'requests': self.requests, 'batches': self.batches, 'mean_batch_size': mean}
+
+
+class ModelWatcher:
+    """Hot-swaps the batcher's predictor when the registry's active version changes.
+
+    A new version is loaded and validated on the watcher thread; only then is
+    ``batcher.predictor`` replaced, in one assignment. Requests already holding
+    the previous predictor finish with it, so none fail during a swap.
+    """
+
+    def __init__(self, batcher, registry, interval=MODEL_POLL_SECONDS):
+        self.batcher = batcher
+        self.registry = registry
+        self.interval = interval
+        self.swaps = 0
+        self.failed = set()
+        self._thread = PerProcess(self._start)
+
+    def ensure_running(self):
+        # Called per request; like the batcher, each forked worker starts its own thread
+        if self.interval > 0:
+            self._thread.get()
+
+    def _start(self):
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Model registry check failed')
+
+    def check(self):
+        version = self.registry.current_version()
+        active = self.batcher.predictor
+        if version is None or version == active.version or version in self.failed:
+            return False
+        try:
+            candidate = Predictor.load_registered(self.registry, version, cache=active.cache)
+            candidate.validate(self.registry.metadata(version))
+        except Exception:
+            # Keep serving the current model; a broken version is not retried
+            self.failed.add(version)
+            logger.exception('Model version %s failed validation; still serving %s', version, active.version)
+            return False
+        self.batcher.predictor = candidate
+        self.swaps += 1
+        logger.info('Swapped model %s -> %s', active.version, version)
+        return True
+
+    def stats(self):
+        return {'active': self.batcher.predictor.version, 'registry': self.registry.current_version(),
+                'swaps': self.swaps, 'failed': sorted(self.failed)}
+
+
+# Loaded at import so the model is warm before the first request
+cache = PredictionCache()
+registry = ModelRegistry()
+predictor = Predictor.load_active(registry, cache=cache)
+batcher = MicroBatcher(predictor)
+watcher = ModelWatcher(batcher, registry)
+
+
+def active():
+    # The predictor currently serving requests (changes on a hot-swap)
+    return batcher.predictor
+
+
+def preload():
+    # Called from the gunicorn master before forking: moving the already-loaded
+    # model out of the GC's tracked generations keeps its pages shared
+    # copy-on-write across workers instead of being touched by collections.
+    gc.collect()
+    gc.freeze()
+
+
+if __name__ == '__main__':
+    # Quick latency measurement: python predictor.py [iterations]
+    import sys
+
+    rng = np.random.default_rng(0)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    records = [record_from_form(rng.integers(0, 2, 10), int(rng.integers(4, 70)),
+                                {'gender': 'female', 'relation': 'self'}) for _ in range(n)]
+
+    start = time.perf_counter()
+    vectors = [predictor.pipeline.transform(record) for record in records]
+    encode_us = (time.perf_counter() - start) / n * 1e6
+
+    for vector in vectors:
+        predictor.predict_proba(vector)
+    stats = predictor.latency_percentiles()
+    print(f"encode: {encode_us:.1f}us/record")
+    print(f"{stats['count']} predictions: p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms")
@@ -0,0 +1,136 @@
+# Recommendation text shared by the web results page (app.py) and the offline
+# report generator (model_training.py). The ten 0/1 answers are packed into a
+# 10-bit mask (bit i = question i + 1) and every one of the 1024 possible
+# combinations is expanded once at import, so serving a results page is a
+# single tuple lookup instead of rebuilding the list per answer.
+import hashlib
+from collections import namedtuple
+
+NUM_QUESTIONS = 10
+
+# What each AQ question measures, used in the written reports
+QUESTION_DESCRIPTIONS = {
+    'A1': 'noticing small sounds when others do not',
+    'A2': 'usually concentrating more on the whole picture rather than small details',
+    'A3': 'finding it easy to do more than one thing at once',
+    'A4': 'if there is an interruption, can switch back to what you were doing quickly',
+    'A5': 'finding it easy to "read between the lines" when someone is talking to you',
+    'A6': 'knowing how to tell if someone listening to you is getting bored',
+    'A7': 'finding it difficult to work out people\'s intentions',
+    'A8': 'finding it difficult to make new friends',
+    'A9': 'enjoying social occasions',
+    'A10': 'finding it hard to work out what other people are thinking or feeling'
+}
+
+QUESTION_RECOMMENDATIONS = {
+    'A1': {
+        1: "Consider sensory training exercises to help manage auditory sensitivity. This might include gradual exposure to different environments with varying noise levels.",
+        0: "Your normal auditory processing is a strength. Continue to maintain balanced sensory environments."
+    },
+    'A2': {
+        1: "Practice focusing on details through activities like puzzles or detailed artwork to balance your tendency to see the whole picture.",
+        0: "Work on seeing the bigger picture through activities that require holistic thinking like strategic games or system mapping."
+    },
+    'A3': {
+        1: "Your ability to multitask is a strength. Continue to utilize this in your daily activities.",
+        0: "Practice single-tasking with full attention, then gradually introduce secondary tasks to improve multitasking abilities."
+    },
+    'A4': {
+        1: "Your ability to resume tasks after interruption is a strength. Continue to apply this skill in structured environments.",
+        0: "Practice task-switching exercises and use techniques like pomodoro method to build task resumption skills."
+    },
+    'A5': {
+        1: "Continue to leverage your ability to understand implied meanings in communication.",
+        0: "Consider practicing contextual interpretation through reading literary texts with metaphors and discussing them with others."
+    },
+    'A6': {
+        1: "Your social attentiveness is a strength. Continue to observe and respond to social cues.",
+        0: "Practice recognizing boredom signals through social skills training or by watching and analyzing social interactions in media."
+    },
+    'A7': {
+        1: "Work with a therapist on theory of mind exercises to better understand others' intentions.",
+        0: "Your ability to understand others' intentions is a strength. Continue to use this in social situations."
+    },
+    'A8': {
+        1: "Consider structured social activities based on your interests to practice friendship-building skills.",
+        0: "Your social connection skills are a strength. Continue to use these skills to build and maintain relationships."
+    },
+    'A9': {
+        1: "Your enjoyment of social occasions is a strength. Continue to engage in social activities that you find pleasant.",
+        0: "Start with small, structured social interactions in environments where you feel comfortable, gradually expanding your comfort zone."
+    },
+    'A10': {
+        1: "Consider emotion recognition training or working with a therapist on empathy-building exercises.",
+        0: "Your emotional intelligence is a strength. Continue to apply this in your interpersonal relationships."
+    }
+}
+
+DEFAULT_RECOMMENDATION = 'Consider consulting with a specialist for personalized guidance.'
+
+# One entry of a results page / report; field names match what results.html reads
+Recommendation = namedtuple(
+    'Recommendation', ['question_id', 'code', 'question', 'value', 'answer', 'description', 'recommendation']
+)
+
+
+def answer_mask(answer_vector):
+    # answer_vector[i] is the 0/1 answer to question i + 1
+    mask = 0
+    for i, answer in enumerate(answer_vector):
+        if answer:
+            mask |= 1 << i
+    return mask
+
+
+def _expand(mask):
+    block = []
+    for question_id in range(1, NUM_QUESTIONS + 1):
+        code = f"A{question_id}"
+        value = (mask >> (question_id - 1)) & 1
+        block.append(Recommendation(
+            question_id=question_id,
+            code=code,
+            question=f"Question {question_id}",
+            value=value,
+            answer="Agree" if value == 1 else "Disagree",
+            description=QUESTION_DESCRIPTIONS.get(code, 'unknown question'),
+            recommendation=QUESTION_RECOMMENDATIONS.get(code, {}).get(value, DEFAULT_RECOMMENDATION)
+        ))
+    return tuple(block)
+
+
+# All 2**10 answer combinations, indexed by mask
+RECOMMENDATION_BLOCKS = tuple(_expand(mask) for mask in range(1 << NUM_QUESTIONS))
+
+GENERAL_HIGH = (
+    "Consider professional evaluation.",
+    "Your answers suggest very high probability of Autism."
+)
+GENERAL_MEDIUM = (
+    "Your results suggest typical characteristics.",
+    "Continue monitoring if concerned."
+)
+GENERAL_LOW = (
+    "Your results suggest that probability of Autism is low, still can take medical advice.",
+)
+
+
+def recommendation_block(mask):
+    return RECOMMENDATION_BLOCKS[mask]
+
+
+def general_recommendations(score):
+    # score is the percentage score (answers agreed * 10)
+    if score >= 80:
+        return GENERAL_HIGH
+    elif score >= 50:
+        return GENERAL_MEDIUM
+    return GENERAL_LOW
+
+
+# Changes whenever any recommendation text does, e.g. for HTTP validators of
+# pages built from them; RECOMMENDATION_BLOCKS is derived from these tables
+CONTENT_VERSION = hashlib.sha256(repr((
+    QUESTION_DESCRIPTIONS, QUESTION_RECOMMENDATIONS, DEFAULT_RECOMMENDATION,
+    GENERAL_HIGH, GENERAL_MEDIUM, GENERAL_LOW,
+)).encode()).hexdigest()[:12]
@@ -0,0 +1,165 @@
+# Incrementally maintained screening statistics. record_attempt() adds one
+# attempt to every rollup with upserts (running counts and sums), so the
+# dashboard reads a handful of small rows instead of scanning the attempt and
+# answer tables. rebuild() recomputes everything from scratch for backfills.
+# The upserts use INSERT ... ON CONFLICT, so SQLite and PostgreSQL are supported.
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import (db, TestAttempt, TestAnswer, User, UserStats, UserDailyStats,
+                    DailyStats, AgeGroupStats, QuestionStats)
+
+AGE_GROUPS = [(12, 'Under 12'), (18, '12-17'), (30, '18-29'), (45, '30-44'), (65, '45-64')]
+TREND_DAYS = 30
+
+
+def age_group(age):
+    if age is None:
+        return 'Unknown'
+    for upper, label in AGE_GROUPS:
+        if age < upper:
+            return label
+    return '65+'
+
+
+def _upsert(dialect_insert, model, keys, counters, latest=()):
+    # INSERT ... ON CONFLICT DO UPDATE: counters are added to, latest columns overwritten
+    stmt = dialect_insert(model)
+    set_ = {name: getattr(model, name) + stmt.excluded[name] for name in counters}
+    set_.update({name: stmt.excluded[name] for name in latest})
+    return stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+
+
+def _upserts(dialect_insert):
+    return {
+        'user': _upsert(dialect_insert, UserStats, ['user_id'], ['test_count', 'positive_count', 'score_sum'],
+                        latest=['last_score', 'last_attempt_at']),
+        'user_day': _upsert(dialect_insert, UserDailyStats, ['user_id', 'day'], ['test_count', 'score_sum']),
+        'day': _upsert(dialect_insert, DailyStats, ['day'], ['test_count', 'positive_count', 'score_sum']),
+        'age_group': _upsert(dialect_insert, AgeGroupStats, ['age_group'], ['test_count', 'positive_count']),
+        'question': _upsert(dialect_insert, QuestionStats, ['question_id'], ['answer_count', 'agree_count']),
+    }
+
+
+# Built once per dialect; each attempt only binds parameters
+UPSERTS = {'sqlite': _upserts(sqlite.insert), 'postgresql': _upserts(postgresql.insert)}
+
+
+def upserts_for(connection):
+    try:
+        return UPSERTS[connection.dialect.name]
+    except KeyError:
+        raise RuntimeError(f'Score rollups need SQLite or PostgreSQL, not {connection.dialect.name}')
+
+
+def record_attempt(user_id, age, answer_vector, score, result, timestamp):
+    # Runs on the session's connection inside the caller's transaction; does not
+    # commit. Plain Core execution keeps this to five cached statements.
+    connection = db.session.connection()
+    upserts = upserts_for(connection)
+    positive = 1 if result == 'Positive' else 0
+    day = timestamp.date()
+
+    connection.execute(upserts['user'], {
+        'user_id': user_id, 'test_count': 1, 'positive_count': positive, 'score_sum': score,
+        'last_score': score, 'last_attempt_at': timestamp
+    })
+    connection.execute(upserts['user_day'], {'user_id': user_id, 'day': day, 'test_count': 1, 'score_sum': score})
+    connection.execute(upserts['day'], {'day': day, 'test_count': 1, 'positive_count': positive, 'score_sum': score})
+    connection.execute(upserts['age_group'], {'age_group': age_group(age), 'test_count': 1,
+                                          'positive_count': positive})
+    # All ten question counters in one executemany
+    connection.execute(upserts['question'], [
+        {'question_id': q_num, 'answer_count': 1, 'agree_count': int(answer)}
+        for q_num, answer in enumerate(answer_vector, start=1)
+    ])
+
+
+def user_summary(user_id):
+    # One primary-key read plus one bounded range read
+    stats = db.session.get(UserStats, user_id)
+    trend = UserDailyStats.query.filter_by(user_id=user_id).order_by(
+        UserDailyStats.day.desc()).limit(TREND_DAYS).all()
+    return {
+        'test_count': stats.test_count if stats else 0,
+        'positive_count': stats.positive_count if stats else 0,
+        'last_score': stats.last_score if stats else None,
+        'average_score': round(stats.score_sum / stats.test_count, 1) if stats and stats.test_count else None,
+        'trend': [
+            {'day': row.day.isoformat(), 'tests': row.test_count,
+             'average_score': round(row.score_sum / row.test_count, 1)}
+            for row in reversed(trend)
+        ],
+    }
+
+
+def aggregate_summary():
+    daily = DailyStats.query.order_by(DailyStats.day.desc()).limit(TREND_DAYS).all()
+    return {
+        'positive_rate_by_age': {
+            row.age_group: round(row.positive_count / row.test_count, 3)
+            for row in AgeGroupStats.query.all() if row.test_count
+        },
+        'agreement_rate_by_question': {
+            row.question_id: round(row.agree_count / row.answer_count, 3)
+            for row in QuestionStats.query.order_by(QuestionStats.question_id).all() if row.answer_count
+        },
+        'daily': [
+            {'day': row.day.isoformat(), 'tests': row.test_count,
+             'positive_rate': round(row.positive_count / row.test_count, 3),
+             'average_score': round(row.score_sum / row.test_count, 1)}
+            for row in reversed(daily)
+        ],
+    }
+
+
+def _accumulate(table, key, **values):
+    row = table.setdefault(key, dict.fromkeys(values, 0))
+    for name, value in values.items():
+        row[name] += value
+    return row
+
+
+def rebuild():
+    # Recompute every rollup from the attempt and answer tables, e.g. to backfill
+    # a database that predates the rollups. Streams attempts; commits.
+    for model in (UserStats, UserDailyStats, DailyStats, AgeGroupStats, QuestionStats):
+        db.session.query(model).delete()
+
+    users, user_days, days, ages = {}, {}, {}, {}
+    attempts = db.session.query(
+        TestAttempt.user_id, TestAttempt.timestamp, TestAttempt.score, TestAttempt.result, User.age
+    ).join(User, User.id == TestAttempt.user_id).filter(
+        TestAttempt.timestamp.isnot(None), TestAttempt.score.isnot(None)
+    ).order_by(TestAttempt.timestamp).yield_per(1000)
+    for user_id, timestamp, score, result, age in attempts:
+        positive = 1 if result == 'Positive' else 0
+        day = timestamp.date()
+        row = _accumulate(users, user_id, test_count=1, positive_count=positive, score_sum=score)
+        row.update(user_id=user_id, last_score=score, last_attempt_at=timestamp)
+        _accumulate(user_days, (user_id, day), test_count=1, score_sum=score).update(user_id=user_id, day=day)
+        _accumulate(days, day, test_count=1, positive_count=positive, score_sum=score)['day'] = day
+        group = age_group(age)
+        _accumulate(ages, group, test_count=1, positive_count=positive)['age_group'] = group
+
+    questions = [
+        {'question_id': question_id, 'answer_count': count, 'agree_count': agrees or 0}
+        for question_id, count, agrees in db.session.query(
+            TestAnswer.question_id, func.count(TestAnswer.id), func.sum(TestAnswer.answer)
+        ).filter(TestAnswer.attempt_id.isnot(None)).group_by(TestAnswer.question_id)
+    ]
+
+    for model, rows in ((UserStats, users), (UserDailyStats, user_days), (DailyStats, days),
+                        (AgeGroupStats, ages), (QuestionStats, questions)):
+        rows = list(rows.values()) if isinstance(rows, dict) else rows
+        if rows:
+            db.session.execute(insert(model), rows)
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        rebuild()
+        print('Rollups rebuilt')
@@ -6,6 +6,9 @@ document.addEventListener('DOMContentLoaded', function() {
     initPasswordMatch();
     initFormValidations();
     initQuestionNavigation();
+    initQuestionnaire();
+    initHistoryAnswers();
+    initLogout();
   });
   
   // ===== Username Availability Check =====
@@ -16,9 +19,11 @@ document.addEventListener('DOMContentLoaded', function() {
     if (!usernameInput || !availabilityText) return;
     
     let timeout;
+    let pending;
     
     usernameInput.addEventListener('input', function() {
       clearTimeout(timeout);
+      if (pending) pending.abort();
       const username = this.value.trim();
       
       if (username.length < 3) {
@@ -31,19 +36,25 @@ document.addEventListener('DOMContentLoaded', function() {
       availabilityText.style.color = 'var(--gray)';
       
       timeout = setTimeout(() => {
-        // Simulate API call (replace with actual fetch)
-        setTimeout(() => {
-          // Mock response - in real app, call your backend
-          const isAvailable = Math.random() > 0.3; // 70% chance available
-          
-          if (isAvailable) {
-            availabilityText.textContent = '✓ Available';
-            availabilityText.style.color = 'var(--success)';
-          } else {
-            availabilityText.textContent = '✗ Already taken';
-            availabilityText.style.color = 'var(--danger)';
-          }
-        }, 500);
+        // Aborting the previous request keeps a slow answer for an older
+        // value from overwriting the current one
+        pending = new AbortController();
+        const url = usernameInput.dataset.checkUrl + '?username=' + encodeURIComponent(username);
+        fetch(url, { signal: pending.signal })
+          .then(response => response.json())
+          .then(data => {
+            if (data.available) {
+              availabilityText.textContent = '✓ Available';
+              availabilityText.style.color = 'var(--success)';
+            } else {
+              availabilityText.textContent = '✗ ' + (data.reason || 'Already taken');
+              availabilityText.style.color = 'var(--danger)';
+            }
+          })
+          .catch(error => {
+            // The registration form still rejects taken names on submit
+            if (error.name !== 'AbortError') availabilityText.textContent = '';
+          });
       }, 300);
     });
   }
@@ -199,6 +210,191 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
   
+  // ===== Single-Page Questionnaire =====
+  // Answers are kept in sessionStorage (so a reload resumes where the user
+  // left off) and sent to the server once, in a single request, at the end.
+  // The key includes the user id, so whoever signs in next in the same tab
+  // does not resume someone else's answers.
+  const QUESTIONNAIRE_STORAGE_PREFIX = 'aq-questionnaire-';
+
+  function initQuestionnaire() {
+    const container = document.getElementById('questionnaire');
+    if (!container) return;
+    
+    const questions = JSON.parse(container.dataset.questions);
+    const storageKey = QUESTIONNAIRE_STORAGE_PREFIX + container.dataset.userId;
+    const questionText = document.getElementById('question-text');
+    const progressBar = container.querySelector('.progress-bar');
+    const progressText = container.querySelector('.progress-text');
+    const options = container.querySelectorAll('.option');
+    const previousButton = document.getElementById('previous-question');
+    const nextButton = document.getElementById('next-question');
+    
+    let state = { current: 0, choices: new Array(questions.length).fill(null) };
+    try {
+      const saved = JSON.parse(sessionStorage.getItem(storageKey));
+      if (saved && saved.choices && saved.choices.length === questions.length) {
+        state = saved;
+      }
+    } catch (e) {
+      sessionStorage.removeItem(storageKey);
+    }
+    
+    function save() {
+      sessionStorage.setItem(storageKey, JSON.stringify(state));
+    }
+    
+    function highlight(option, selected) {
+      option.style.borderColor = selected ? '#4361ee' : '#e9ecef';
+      option.style.backgroundColor = selected ? 'rgba(67, 97, 238, 0.05)' : 'transparent';
+    }
+    
+    function render() {
+      const index = state.current;
+      const choice = state.choices[index];
+      
+      questionText.textContent = questions[index];
+      progressBar.style.width = `${(index + 1) * 100 / questions.length}%`;
+      progressText.textContent = `Question ${index + 1} of ${questions.length}`;
+      
+      options.forEach(option => {
+        const input = option.querySelector('input');
+        input.checked = choice !== null && Number(input.dataset.choice) === choice;
+        highlight(option, input.checked);
+      });
+      
+      previousButton.textContent = index === 0 ? 'Back to Demographics' : 'Previous Question';
+      nextButton.textContent = index === questions.length - 1 ? 'Submit Test' : 'Next Question';
+    }
+    
+    options.forEach(option => {
+      option.addEventListener('click', function() {
+        const input = this.querySelector('input');
+        input.checked = true;
+        state.choices[state.current] = Number(input.dataset.choice);
+        options.forEach(opt => highlight(opt, opt === this));
+        save();
+      });
+    });
+    
+    previousButton.addEventListener('click', function(e) {
+      // On the first question the link simply goes back to demographics
+      if (state.current === 0) return;
+      e.preventDefault();
+      state.current -= 1;
+      save();
+      render();
+    });
+    
+    nextButton.addEventListener('click', function() {
+      if (state.choices[state.current] === null) {
+        alert('Please select an answer');
+        return;
+      }
+      if (state.current < questions.length - 1) {
+        state.current += 1;
+        save();
+        render();
+        return;
+      }
+      submit();
+    });
+    
+    function submit() {
+      // "Agree" and "Slightly Agree" score 1, the two disagree options score 0
+      const answers = state.choices.map(choice => (choice <= 1 ? 1 : 0));
+      
+      nextButton.disabled = true;
+      nextButton.textContent = 'Submitting...';
+      
+      fetch(container.dataset.submitUrl, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ answers: answers })
+      })
+        .then(response => {
+          if (!response.ok) throw new Error(`HTTP ${response.status}`);
+          return response.json();
+        })
+        .then(data => {
+          sessionStorage.removeItem(storageKey);
+          window.location.href = data.redirect;
+        })
+        .catch(() => {
+          alert('Error saving your answers, please try again');
+          nextButton.disabled = false;
+          render();
+        });
+    }
+    
+    render();
+  }
+  
+  // ===== Logout =====
+  // Saved questionnaire answers do not outlive the session on a shared device
+  function initLogout() {
+    document.querySelectorAll('[data-logout]').forEach(link => {
+      link.addEventListener('click', () => {
+        Object.keys(sessionStorage)
+          .filter(key => key.startsWith(QUESTIONNAIRE_STORAGE_PREFIX))
+          .forEach(key => sessionStorage.removeItem(key));
+      });
+    });
+  }
+
+  // ===== History: Answers On Demand =====
+  // The history page only lists attempts; each attempt's responses are
+  // fetched the first time its card is expanded.
+  function initHistoryAnswers() {
+    const buttons = document.querySelectorAll('.show-answers');
+    
+    buttons.forEach(button => {
+      const grid = button.nextElementSibling;
+      let loaded = false;
+      
+      button.addEventListener('click', function() {
+        if (loaded) {
+          grid.hidden = !grid.hidden;
+          button.textContent = grid.hidden ? 'Show Question Responses' : 'Hide Question Responses';
+          return;
+        }
+        
+        button.disabled = true;
+        fetch(button.dataset.answersUrl)
+          .then(response => {
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            return response.json();
+          })
+          .then(answers => {
+            answers.forEach(answer => {
+              const item = document.createElement('div');
+              item.className = 'answer-item';
+              
+              const question = document.createElement('span');
+              question.className = 'question';
+              question.textContent = `Q${answer.question_id}:`;
+              
+              const response = document.createElement('span');
+              response.className = `response ${answer.answer ? 'agree' : 'disagree'}`;
+              response.textContent = answer.answer ? 'Agree' : 'Disagree';
+              
+              item.append(question, response);
+              grid.appendChild(item);
+            });
+            loaded = true;
+            grid.hidden = false;
+            button.textContent = 'Hide Question Responses';
+          })
+          .catch(() => {
+            alert('Could not load the responses for this test');
+          })
+          .finally(() => {
+            button.disabled = false;
+          });
+      });
+    });
+  }
+  
   // ===== Results Page Animations =====
   if (document.querySelector('.result-summary')) {
     const scoreCircle = document.querySelector('.score-circle');
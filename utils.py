@@ -0,0 +1,36 @@
+# Small helpers shared by the web app, training and the batch tools.
+import os
+import threading
+from itertools import islice
+
+
+def chunked(iterable, size):
+    # Lists of up to size items, read lazily; the last one may be shorter
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+class PerProcess:
+    """Lazily built state that is built again in every forked process.
+
+    Threads and thread pools do not survive fork, so state made by a preloading
+    gunicorn master must not be reused by its workers. ``get()`` calls
+    ``factory`` once per process, on first use, and returns its result.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self.factory()
+                    self._pid = os.getpid()
+        return self._value